@@ -11,13 +11,22 @@ https://code.tutsplus.com/tutorials/creating-a-web-app-from-scratch-using-python
 # imports 
 # ---------------------------------------------------------------------------------------------------- #
 
+import gc
+import itertools
 import os
-import ast
-import statistics
-from flask import Flask, render_template, request
+import time
+import flask
+from flask import Flask, Response, abort, g, jsonify, redirect, request, stream_with_context, url_for
 from forms import *
+import config
+import export
 import helper_functions as helper
+import line_index
+import metrics
+import search_engine
 import sentiment_analyzer as analyzer
+import transcript_catalog as catalog
+import transcription_jobs as jobs
 
 # ---------------------------------------------------------------------------------------------------- #
 # main
@@ -26,6 +35,75 @@ import sentiment_analyzer as analyzer
 # initialize the app
 app = Flask(__name__)
 
+TRANSCRIPTS_PER_PAGE = 50
+
+
+def render_template(template_name, **context):
+	# flask's render_template, timed as a stage of its own
+	with metrics.span("render_template", template=template_name):
+		return flask.render_template(template_name, **context)
+
+
+def warm_up():
+	"""loads everything the pages otherwise load lazily on first use. run once in a server's master process
+	before it forks, then the workers start with vader's lexicon and the sdks already in memory and share
+	those pages copy on write. gc.freeze keeps the garbage collector from writing to them and breaking
+	that sharing"""
+	analyzer.warm_up()
+	helper.warm_up()
+	gc.freeze()
+
+
+if config.warm_up_on_import:
+	warm_up()
+
+
+# ---------------------------------------------------------------------------------------------------- #
+# request timing
+# ---------------------------------------------------------------------------------------------------- #
+
+@app.before_request
+def start_request_timer():
+	g.request_start = time.perf_counter()
+	g.request_profile = metrics.profiler.start()
+
+
+@app.before_request
+def start_job_worker():
+	# resumes jobs left unfinished by a restart. started here rather than on import so a server that
+	# forks its workers after loading the app starts one in each worker and none in the master
+	if config.job_worker_on_first_request:
+		jobs.start_worker()
+
+
+@app.after_request
+def record_request(response):
+	# requests are grouped by their route pattern, so /analytics/a.json and /analytics/b.json count together
+	elapsed = time.perf_counter() - g.request_start
+	route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+	metrics.observe(metrics.REQUEST_SECONDS, elapsed, route=route, method=request.method,
+					status=str(response.status_code))
+	metrics.profiler.stop(g.pop("request_profile", None), request.method + " " + route, elapsed)
+	return response
+
+
+@app.teardown_request
+def stop_request_profile(error=None):
+	# a request that died before after_request still has to switch its profiler off
+	profile = g.pop("request_profile", None)
+	if profile is not None:
+		profile.disable()
+
+
+@app.route("/metrics")
+def metrics_page():
+	return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+# ---------------------------------------------------------------------------------------------------- #
+# home
+# ---------------------------------------------------------------------------------------------------- #
+
 
 # the home screen
 @app.route("/")
@@ -39,53 +117,76 @@ def main():
 
 @app.route("/sendfiles")
 def send_files():
-	helper.send_batch("audio_files")
-	return render_template("index.html")
+	# transcription runs in the background, the page gets the job's id to follow its progress
+	job_id = jobs.enqueue("audio_files")
+	jobs.start_worker()
+	return render_template("index.html", job_id=job_id)
+
+
+@app.route("/jobs/<job_id>")
+def job_status(job_id):
+	jobs.start_worker()
+	status = jobs.job_status(job_id)
+	if status is None:
+		abort(404)
+	return jsonify(status)
 
 
 # ---------------------------------------------------------------------------------------------------- #
 
 @app.route("/transcripts")
 def transcripts():
-	# set up the selections for 
-	transcriptions = []
-	for json_file in os.listdir(os.getcwd()):
-		if json_file.endswith(".json"):
-			transcriptions.append(json_file)
+	# the catalog keeps track of every transcript, so a page of them is a single indexed query
+	page = max(request.args.get("page", 1, type=int), 1)
+	sort = request.args.get("sort", "date")
+	order = request.args.get("order", "desc")
+	descending = order != "asc"
+	rows = catalog.list_transcripts(sort=sort, descending=descending, limit=TRANSCRIPTS_PER_PAGE,
+									offset=(page - 1) * TRANSCRIPTS_PER_PAGE)
+	transcriptions = [row["path"] for row in rows]
+	has_next = page * TRANSCRIPTS_PER_PAGE < catalog.count_transcripts()
 
-	return render_template("transcripts.html", transcripts=transcriptions)
+	return render_template("transcripts.html", transcripts=transcriptions, page=page, sort=sort,
+						   order=order, has_next=has_next)
 
 
 # ---------------------------------------------------------------------------------------------------- #
 
-@app.route("/analytics/<transcript>")
+@app.route("/analytics/<path:transcript>")
 def analytics(transcript):
-	"""for each of the different analytic functions, we need to pass the desired outputs, because all 
-	data structures get converted to strings""" 
-
-	# get the dictionary from json data
-	converted_json = helper.convert_json_to_data(transcript)
+	"""the analytic pages are all handed the transcript's name and load what they need from it on the
+	server, rather than getting the data itself through the url"""
 
-	# transcript already a string
-	transcript = converted_json.get("transcript")
+	# get the dictionary from json data, reusing the parsed copy while the file is unchanged
+	converted_json = load_transcript_or_404(transcript)
 
 	# format total confidence
 	percent = round(float(converted_json.get("confidence"))*100, 2)
 
-	# format the word confidence levels
-	word_conf = converted_json.get("words")
-
 	# render the template!
-	return render_template("analytics.html", text=transcript, percent=percent, words=word_conf)
+	return render_template("analytics.html", transcript=transcript, percent=percent)
+
+
+def load_transcript_or_404(transcript):
+	# only catalogued transcripts are served, not whatever json file sits in the working directory
+	if not catalog.has_transcript(transcript):
+		abort(404)
+	try:
+		return helper.load_transcript(transcript)
+	except (OSError,) + helper.NOT_A_TRANSCRIPT:
+		abort(404)
 
 
 # ---------------------------------------------------------------------------------------------------- #
 # ibm analytics pages
 # ---------------------------------------------------------------------------------------------------- #
 
-@app.route("/printtranscript/<text>")
-def print_transcript(text):
-	return render_template("printtranscript.html", text=text)
+@app.route("/printtranscript/<path:transcript>")
+def print_transcript(transcript):
+	# each chunk is its own paragraph, #chunk-<n> links straight to one of them
+	converted_json = load_transcript_or_404(transcript)
+	return render_template("printtranscript.html", text=converted_json.get("transcript"),
+						   chunks=converted_json.get("chunks"))
 
 
 # ---------------------------------------------------------------------------------------------------- #
@@ -98,37 +199,50 @@ def total_confidence(percent):
 
 # ---------------------------------------------------------------------------------------------------- #
 
-@app.route("/wordconfidence/<words>")
-def word_confidence(words):
-	words = ast.literal_eval(words)
-	new_words = []
-	for word in words:
-		percent = round(word[1]*100, 2)
-		new_words.append([word[0], percent])
-
-	return render_template("wordconfidence.html", words=new_words)
+@app.route("/wordconfidence/<path:transcript>")
+def word_confidence(transcript):
+	words = load_transcript_or_404(transcript).get("words")
+	summary = {}
+	if len(words):
+		summary = {"mean": round(words.mean()*100, 2), "median": round(words.percentile(50)*100, 2),
+				   "low": round(words.percentile(10)*100, 2), "spans": len(words.low_confidence_spans(0.5, 3))}
+	return render_template("wordconfidence.html", words=words.percentages(), summary=summary,
+						   histogram=words.histogram())
 
 
 # ---------------------------------------------------------------------------------------------------- #
 
-@app.route("/analyzetone/<text>")
-def analyze_tone(text):
+@app.route("/analyzetone/<path:transcript>")
+def analyze_tone(transcript):
+	converted_json = load_transcript_or_404(transcript)
 	try:
-		tones = helper.analyze_tone(text)
+		# ?mode=chunked analyzes each stretch of the call on its own and adds a tone over time table
+		timeline = None
+		if request.args.get("mode") == "chunked":
+			chunked = helper.analyze_tone_chunks(converted_json.get("chunks"))
+			tones = chunked["document"]
+			timeline = chunked["timeline"]
+			for point in timeline:
+				point["tones"] = {tone: float(round(score*100, 2)) for tone, score in point["tones"].items()}
+		else:
+			tones = helper.analyze_tone(converted_json.get("transcript"))
 		for tone in tones:
 			tones[tone] = float(round(tones[tone]*100, 2))
-		return render_template("analyzetone.html", text=tones)
+		return render_template("analyzetone.html", text=tones, timeline=timeline)
 	except:
 		return render_template("nopersonality.html")
 
 
 # ---------------------------------------------------------------------------------------------------- #
 
-@app.route("/personalityinsights/<text>")
-def personality_menu(text):
+@app.route("/personalityinsights/<path:transcript>")
+def personality_menu(transcript):
+	converted_json = load_transcript_or_404(transcript)
+	percent = round(float(converted_json.get("confidence"))*100, 2)
 	try:
-		personality = helper.analyze_personality(text)
-		return render_template("personalitymenu.html", personality=personality)
+		personality = helper.analyze_personality(converted_json.get("transcript"))
+		return render_template("personalitymenu.html", personality=personality, transcript=transcript,
+							   percent=percent)
 	except:
 		return render_template("nopersonality.html")
 
@@ -139,17 +253,32 @@ def personality_menu(text):
 
 @app.route("/analysismenu/")
 def text_analysis_menu():
-	folder_name = "test_text/neg_reviews/"
-	sentiment_scores = analyzer.read_and_score_text_files(folder_name)
-	top_20 = analyzer.get_20_most_neg_files(sentiment_scores)
-	return render_template("analysismenu.html", files=top_20, scores=sentiment_scores)
+	# rescore the corpus on every visit to the menu, the pages it links to reuse these scores
+	corpus = "neg_reviews"
+	analyzer.score_corpus(corpus_folder_or_404(corpus))
+	return render_template("analysismenu.html", corpus=corpus)
+
+
+def corpus_folder_or_404(corpus):
+	folder_name = config.text_corpora.get(corpus)
+	if folder_name is None:
+		abort(404)
+	return folder_name
 
 
 # ---------------------------------------------------------------------------------------------------- #
 
-@app.route("/rankfiles/<files>")
-def rank_files(files):
-	files = ast.literal_eval(files)
+@app.route("/rankfiles/<corpus>")
+def rank_files(corpus):
+	# defaults to the 20 files with the most negative line, ?k=&most=positive&aggregate=mean to change it
+	sentiment_scores = analyzer.get_corpus_scores(corpus_folder_or_404(corpus))
+	k = request.args.get("k", 20, type=int)
+	most = request.args.get("most", "negative")
+	aggregate = request.args.get("aggregate", "worst")
+	try:
+		files = dict(analyzer.top_k_files(analyzer.scores_by_file(sentiment_scores), k, most, aggregate))
+	except ValueError:
+		abort(400)
 	return render_template("rankfiles.html", files=files)
 
 
@@ -160,58 +289,77 @@ def search_files():
 	if request.method == "POST":
 		search = stringSearchForm(request.form)
 		if request.method == "POST":
-			return search_results(search)
-	return render_template("searchfiles.html")
+			mode = search.data.get('select') or "fuzzy"
+			return redirect(url_for("search_results", search=search.data['search'], mode=mode))
+	return render_template("searchfiles.html", modes=search_engine.MODES)
 
 
 @app.route("/searchresults.html/")
-def search_results(search):
-	search_string = search.data['search']
-	data = analyzer.search_files(search_string)
-	sorted_data = analyzer.sort_search(data)
-	num_files = {}
-	for file in data:
-		num_app = len(data[file])
-		num_files[file] = num_app
+def search_results():
+	# one search over every text folder and every transcript, ranked by BM25 and taken off the engine's
+	# results a page at a time. ?mode= is exact, prefix or fuzzy
+	search_string = request.args.get("search", "")
+	mode = request.args.get("mode", "fuzzy")
+	page = max(request.args.get("page", 1, type=int), 1)
+	per_page = config.search_results_per_page
+	try:
+		ranked = search_engine.search(search_string, mode)
+		results = list(itertools.islice(ranked, (page - 1) * per_page, page * per_page + 1))
+	except ValueError:
+		abort(400)
 
-	return render_template("searchresults.html", sorteddata=sorted_data, filenums=num_files)
+	return render_template("searchresults.html", results=results[:per_page], search=search_string, mode=mode,
+						   page=page, has_next=len(results) > per_page)
 
 @app.route("/viewfile.html/<text>")
 def view_file(text):
-	folder = "test_text/neg_reviews/"
-	file_text = open(folder + text).readlines()
-	return render_template("viewfile.html", text=file_text)
+	# a page of lines at a time, ?cursor= is the line number the page starts at
+	corpus = request.args.get("corpus", "neg_reviews")
+	folder = corpus_folder_or_404(corpus)
+	try:
+		page = line_index.read_page(os.path.join(folder, text), request.args.get("cursor", 0, type=int))
+	except OSError:
+		abort(404)
+	return render_template("viewfile.html", text=page["lines"], page=page, name=text, corpus=corpus)
 
 
 # ---------------------------------------------------------------------------------------------------- #
 
-@app.route("/graphsentiment/<scores>")
-def graph_sentiment(scores):
-	scores = ast.literal_eval(scores)
-	# the labels for this graph are [0-25, 25-50, 50-75, 75-100] indicating the semantic score range of calls
-	pos_total = 0
-	neg_total = 0
+@app.route("/graphsentiment/<corpus>")
+def graph_sentiment(corpus):
+	# everything on the page comes from the corpus summary, kept up to date as files are scored, so the
+	# page costs the same however many files the corpus has
+	summary = analyzer.get_corpus_summary(corpus_folder_or_404(corpus))
+	mean = summary.mean()
+	median = summary.median()
+	mean = round(mean * 100, 2) if mean is not None else 0
+	median = round(median * 100, 2) if median is not None else 0
 
-	mean = round(statistics.mean(scores), 2) * 100
-	median = round(statistics.median(scores), 2) * 100
+	# the chart shows how many lines fall in each 0.1 wide slice of the score range
+	histogram = summary.histogram()
+	labels = ["%.1f" % low for low, high, count in histogram]
+	counts = [count for low, high, count in histogram]
 
-	total_count = 0
-	files = []
-	score_points = []
+	return render_template("graphsentiment.html", mean=mean, median=median, count=summary.files,
+						   lines=summary.count, postot=summary.positive, negtot=summary.negative, labels=labels,
+						   counts=counts)
 
-	for score in scores:
-		score_files = scores[score]
-		for file in score_files:
-			total_count += 1
-			if score >= 0:
-				pos_total += 1
-			else:
-				neg_total += 1
-			files.append(file)
-			score_points.append(score)
 
-	return render_template("graphsentiment.html", mean=mean, median=median, count=total_count, postot=pos_total,
-						   negtot=neg_total, files=files, scores=score_points)
+# ---------------------------------------------------------------------------------------------------- #
+# bulk export
+# ---------------------------------------------------------------------------------------------------- #
+
+@app.route("/export/<kind>")
+def export_data(kind):
+	"""streams an export as it is generated, e.g. /export/words?format=csv&since=2019-01-01&min_confidence=0.6"""
+	export_format = request.args.get("format", "ndjson")
+	try:
+		lines = export.export(kind, export_format, export.parse_time(request.args.get("since")),
+							  export.parse_time(request.args.get("until")),
+							  request.args.get("min_confidence", type=float))
+	except ValueError:
+		abort(400)
+	return Response(stream_with_context(lines), mimetype=export.FORMATS[export_format])
 
 
 # ---------------------------------------------------------------------------------------------------- #
@@ -219,4 +367,6 @@ def graph_sentiment(scores):
 # ---------------------------------------------------------------------------------------------------- #
 
 if __name__ == "__main__":
+	# pick back up any transcription job a previous run didn't finish
+	jobs.start_worker()
 	app.run(debug=False)
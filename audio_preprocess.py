@@ -0,0 +1,125 @@
+"""
+Shrinks wav files before they are sent for transcription: stereo is mixed down to mono, audio recorded
+above the recognizer's sample rate is resampled down to it, and long stretches of silence (hold music
+fades, dead air) are cut short. the file is processed a few milliseconds at a time, so memory use
+doesn't grow with the length of the call. compressed wav files that the wave module can't decode are
+left as they are
+
+@author Preston Mackert
+"""
+
+# ---------------------------------------------------------------------------------------------------- #
+# imports
+# ---------------------------------------------------------------------------------------------------- #
+
+import os
+import wave
+from collections import deque
+import config
+
+
+# ---------------------------------------------------------------------------------------------------- #
+# preprocessing
+# ---------------------------------------------------------------------------------------------------- #
+
+# silence is judged over windows of this many seconds
+WINDOW_SECONDS = 0.03
+
+
+def preprocess_wav(in_path, out_path, sample_rate=None, silence_rms=None, keep_silence=None):
+    """ writes a 16 bit mono copy of a pcm wav file to out_path, resampled down to sample_rate if it is
+    higher, and with every silence longer than twice keep_silence seconds shortened to that, keeping
+    keep_silence seconds after the sound before it and before the sound after it. silence at the start
+    and end is trimmed the same way. returns how the two files compare, and raises wave.Error for audio
+    the wave module can't read and ImportError where audioop is missing (python 3.13 and later) """
+    # audioop is deprecated and removed in python 3.13, importing it here keeps the module importable
+    import audioop
+    silence_rms = config.preprocess_silence_rms if silence_rms is None else silence_rms
+    keep_silence = config.preprocess_keep_silence_seconds if keep_silence is None else keep_silence
+
+    with wave.open(in_path, "rb") as source:
+        channels, width, rate, total_frames = (source.getnchannels(), source.getsampwidth(),
+                                               source.getframerate(), source.getnframes())
+        if channels > 2:
+            raise wave.Error("can only mix down mono or stereo audio, not " + str(channels) + " channels")
+        out_rate = min(rate, sample_rate) if sample_rate else rate
+        window = max(int(rate * WINDOW_SECONDS), 1)
+        keep_windows = int(round(keep_silence / WINDOW_SECONDS))
+
+        # the silent windows just before the current one, written out if sound follows them
+        held_back = deque(maxlen=keep_windows)
+        silent_run = 0
+        heard_sound = False
+        written_bytes = 0
+        resample_state = None
+
+        with wave.open(out_path, "wb") as sink:
+            sink.setnchannels(1)
+            sink.setsampwidth(2)
+            sink.setframerate(out_rate)
+            while True:
+                frames = source.readframes(window)
+                if not frames:
+                    break
+                frames = to_mono_16bit(frames, channels, width)
+                if out_rate != rate:
+                    frames, resample_state = audioop.ratecv(frames, 2, 1, rate, out_rate, resample_state)
+
+                if audioop.rms(frames, 2) >= silence_rms:
+                    while held_back:
+                        written_bytes += write(sink, held_back.popleft())
+                    written_bytes += write(sink, frames)
+                    heard_sound = True
+                    silent_run = 0
+                    continue
+
+                silent_run += 1
+                if heard_sound and silent_run <= keep_windows:
+                    written_bytes += write(sink, frames)
+                elif keep_windows:
+                    held_back.append(frames)
+
+    seconds_before = float(total_frames) / rate
+    seconds_after = written_bytes / 2.0 / out_rate
+    bytes_before = os.path.getsize(in_path)
+    bytes_after = os.path.getsize(out_path)
+    return {"bytes_before": bytes_before, "bytes_after": bytes_after, "bytes_saved": bytes_before - bytes_after,
+            "seconds_before": seconds_before, "seconds_after": seconds_after,
+            "seconds_saved": seconds_before - seconds_after}
+
+
+def to_mono_16bit(frames, channels, width):
+    """ pcm frames of any sample width, mono or stereo, as 16 bit mono. raises ImportError without
+    audioop """
+    import audioop
+    if width == 1:
+        # 8 bit wav samples are unsigned, audioop expects signed ones
+        frames = audioop.bias(frames, 1, -128)
+    if channels == 2:
+        frames = audioop.tomono(frames, width, 0.5, 0.5)
+    if width != 2:
+        frames = audioop.lin2lin(frames, width, 2)
+    return frames
+
+
+def write(sink, frames):
+    # writeframesraw leaves the header alone until the file is closed, writeframes rewrites it each time
+    sink.writeframesraw(frames)
+    return len(frames)
+
+
+def prepare_audio(in_path, out_folder, sample_rate=None):
+    """ the path to transcribe in_path from and how much preprocessing saved. wav files are preprocessed
+    into out_folder under the same name. anything else, wav files the wave module can't decode, and every
+    file on a python without audioop are used as they are with a report saying why """
+    if not in_path.lower().endswith(".wav"):
+        return in_path, {"skipped": "not a wav file"}
+    out_path = os.path.join(out_folder, os.path.basename(in_path))
+    try:
+        return out_path, preprocess_wav(in_path, out_path, sample_rate)
+    except ImportError as error:
+        return in_path, {"skipped": "no audioop to preprocess with (" + str(error) + ")"}
+    except (wave.Error, EOFError) as error:
+        if os.path.exists(out_path):
+            os.remove(out_path)
+        return in_path, {"skipped": str(error)}
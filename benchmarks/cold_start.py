@@ -0,0 +1,113 @@
+"""
+Measures how long a fresh worker takes to come up: the import time of app.py and the modules it pulls
+in (from python's -X importtime), and the wall time from process start to serving its first page,
+with and without warm_up. every measurement runs in a new interpreter:
+
+    python benchmarks/cold_start.py [--runs 5] [--output cold_start.json]
+
+@author Preston Mackert
+"""
+
+# ---------------------------------------------------------------------------------------------------- #
+# imports
+# ---------------------------------------------------------------------------------------------------- #
+
+import argparse
+import ast
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# the modules worth watching, whether or not they are imported at startup
+WATCHED = ["app", "flask", "helper_functions", "sentiment_analyzer", "export", "watson_developer_cloud",
+           "vaderSentiment", "fuzzywuzzy", "wtforms", "numpy"]
+
+# times a fresh process from just before importing the app until the first response of each page
+FIRST_REQUEST = """
+import os, sys, tempfile, time
+sys.path.insert(0, %(root)r)
+import config, transcript_catalog
+config.job_worker_on_first_request = False
+# the transcript pages only serve catalogued transcripts, so message.json goes in a throwaway catalog
+config.catalog_path = os.path.join(tempfile.mkdtemp(), "transcripts.db")
+transcript_catalog.record_transcript("message.json", 0, 0.0)
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+if %(warm_up)r:
+    app.warm_up()
+warmed = time.perf_counter()
+client = app.app.test_client()
+timings = {"import": imported - start, "warm_up": warmed - imported}
+for page in %(pages)r:
+    before = time.perf_counter()
+    client.get(page)
+    timings[page] = time.perf_counter() - before
+timings["total"] = time.perf_counter() - start
+print(repr(timings))
+"""
+
+PAGES = ["/", "/transcripts", "/wordconfidence/message.json"]
+
+
+# ---------------------------------------------------------------------------------------------------- #
+# measuring
+# ---------------------------------------------------------------------------------------------------- #
+
+def import_times():
+    """ cumulative import time in seconds of each watched module when app.py is imported """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app"], cwd=ROOT,
+                            capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit() and name.strip() in WATCHED:
+            times[name.strip()] = int(cumulative) / 1e6
+    return times
+
+
+def first_request(warm_up):
+    script = FIRST_REQUEST % {"root": ROOT, "warm_up": warm_up, "pages": PAGES}
+    result = subprocess.run([sys.executable, "-c", script], cwd=ROOT, capture_output=True, text=True,
+                            check=True)
+    return ast.literal_eval(result.stdout.strip().splitlines()[-1])
+
+
+def median_of(runs):
+    return {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+
+
+# ---------------------------------------------------------------------------------------------------- #
+# main method
+# ---------------------------------------------------------------------------------------------------- #
+
+def main():
+    parser = argparse.ArgumentParser(description="time app.py's imports and a new worker's first pages")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--output", help="write the results to this json file")
+    args = parser.parse_args()
+
+    imports = median_of([import_times() for _ in range(args.runs)])
+    lazy = median_of([first_request(False) for _ in range(args.runs)])
+    warmed = median_of([first_request(True) for _ in range(args.runs)])
+
+    print("import time (cumulative, median of %d)" % args.runs)
+    for name in WATCHED:
+        print("  %-24s %s" % (name, "%8.1f ms" % (imports[name] * 1000) if name in imports else "not imported"))
+    print("new worker, seconds            lazy    warm_up")
+    for key in lazy:
+        print("  %-28s %7.3f %9.3f" % (key, lazy[key], warmed[key]))
+
+    if args.output:
+        with open(args.output, "w") as outfile:
+            json.dump({"imports": imports, "lazy": lazy, "warm_up": warmed}, outfile, indent=2)
+
+
+if __name__ == "__main__":
+    main()
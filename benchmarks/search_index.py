@@ -0,0 +1,84 @@
+"""
+Times the search engine's fuzzy mode against the original full scan on a synthetic corpus and checks
+that both find the same matches in the same files. run from the repository root:
+
+    python benchmarks/search_index.py [number of files]
+
+@author Preston Mackert
+"""
+
+# ---------------------------------------------------------------------------------------------------- #
+# imports
+# ---------------------------------------------------------------------------------------------------- #
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fuzzywuzzy import fuzz
+import config
+import search_engine
+from synthetic import text_corpus, write_text_folder
+
+
+# ---------------------------------------------------------------------------------------------------- #
+# support methods
+# ---------------------------------------------------------------------------------------------------- #
+
+def full_scan(text_db, keyphrase):
+    """ the original search, kept here as the reference the engine has to agree with """
+    table_data = {}
+    for file in text_db:
+        for line in text_db[file]:
+            for word in line.split(" "):
+                if fuzz.ratio(keyphrase, word) >= 75:
+                    if file in table_data.keys():
+                        table_data[file].append(fuzz.ratio(keyphrase, word))
+                    else:
+                        table_data[file] = [fuzz.ratio(keyphrase, word)]
+    return table_data
+
+
+# ---------------------------------------------------------------------------------------------------- #
+# main method
+# ---------------------------------------------------------------------------------------------------- #
+
+def main():
+    num_files = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    corpus, vocabulary = text_corpus(num_files)
+
+    # the corpus is the only thing indexed, the catalog is a fresh empty one
+    scratch = tempfile.mkdtemp()
+    write_text_folder(os.path.join(scratch, "reviews"), corpus)
+    config.text_corpora = {"bench": os.path.join(scratch, "reviews")}
+    config.catalog_path = os.path.join(scratch, "transcripts.db")
+
+    start = time.perf_counter()
+    search_engine.engine.refresh(force=True)
+    print("indexed %d files in %.3fs" % (num_files, time.perf_counter() - start))
+
+    queries = random.Random(1).sample(vocabulary[:2000], 5)
+    scan_total = index_total = 0.0
+    for query in queries:
+        start = time.perf_counter()
+        expected = full_scan(corpus, query)
+        scan_total += time.perf_counter() - start
+
+        start = time.perf_counter()
+        found = list(search_engine.search(query, "fuzzy"))
+        index_total += time.perf_counter() - start
+
+        # the same number of matching words in every file
+        if {result["name"]: result["count"] for result in found} != \
+                {file: len(scores) for file, scores in expected.items()}:
+            raise SystemExit("results differ for " + repr(query))
+
+    print("full scan: %.3fs per query" % (scan_total / len(queries)))
+    print("engine:    %.3fs per query" % (index_total / len(queries)))
+
+if __name__ == "__main__":
+    main()
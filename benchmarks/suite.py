@@ -0,0 +1,200 @@
+"""
+Benchmark suite for the hot paths of the app: parsing transcripts, scoring text folders with vader,
+searching and ranking files, and rendering the analytics and graph pages. every stage runs against
+synthetic data at the chosen scales inside a scratch folder, with all watson clients stubbed out so the
+suite never touches the network. results are written as json so two runs can be compared:
+
+    python benchmarks/suite.py --scale small medium --output before.json
+    python benchmarks/suite.py --scale small medium --output after.json --compare before.json
+
+@author Preston Mackert
+"""
+
+# ---------------------------------------------------------------------------------------------------- #
+# imports
+# ---------------------------------------------------------------------------------------------------- #
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+import helper_functions as helper
+import migrate_transcripts
+import search_engine
+import sentiment_analyzer as analyzer
+import synthetic
+import transcript_catalog as catalog
+
+
+# ---------------------------------------------------------------------------------------------------- #
+# settings
+# ---------------------------------------------------------------------------------------------------- #
+
+# words per transcript and files per text folder at each scale
+SCALES = {
+    "small": {"words": 1000, "files": 50},
+    "medium": {"words": 10000, "files": 500},
+    "large": {"words": 50000, "files": 2000},
+}
+
+CORPUS = "bench"
+
+
+class OfflineClient(object):
+    """ stands in for every watson client, any attempt to reach the service fails loudly """
+
+    def __getattr__(self, name):
+        raise RuntimeError("the benchmark suite runs offline, " + name + " tried to call watson")
+
+
+# ---------------------------------------------------------------------------------------------------- #
+# measuring
+# ---------------------------------------------------------------------------------------------------- #
+
+def measure(stage, repeat=5, setup=None):
+    """ times stage repeat times, calling setup untimed before each run, then runs it once more under
+    tracemalloc for its peak memory """
+    timings = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        stage()
+        timings.append(time.perf_counter() - start)
+
+    if setup is not None:
+        setup()
+    tracemalloc.start()
+    try:
+        stage()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {"best_seconds": min(timings), "mean_seconds": sum(timings) / len(timings), "peak_bytes": peak,
+            "repeat": repeat}
+
+
+def run_scale(scale, repeat):
+    """ builds the data for one scale in the current folder and measures every stage """
+    sizes = SCALES[scale]
+    results = {}
+
+    # transcripts, in the old double encoded format and in the compact one
+    watson_results = synthetic.watson_results(sizes["words"])
+    synthetic.write_legacy_transcript("legacy.json", watson_results)
+    synthetic.write_legacy_transcript("compact.json", watson_results)
+    migrate_transcripts.migrate_file("compact.json")
+    results["parse_legacy"] = measure(lambda: helper.convert_json_to_data("legacy.json"), repeat)
+    results["parse_compact"] = measure(lambda: helper.convert_json_to_data("compact.json"), repeat)
+    # a new catalog is filled from the working directory, done here so no timed stage pays for it
+    catalog.count_transcripts()
+
+    # text folder scoring, cold in one process, cold across processes, and warm from the score store
+    folder_name = os.path.join(scale + "_reviews", "")
+    corpus, words = synthetic.text_corpus(sizes["files"])
+    synthetic.write_text_folder(folder_name, corpus)
+    config.text_corpora[CORPUS] = folder_name
+    results["score_serial"] = measure(lambda: analyzer.read_and_score_text_files(folder_name, workers=1,
+                                                                                 use_store=False), repeat)
+    results["score_parallel"] = measure(lambda: analyzer.read_and_score_text_files(folder_name,
+                                                                                   use_store=False), repeat)
+    analyzer.read_and_score_text_files(folder_name)
+    results["score_warm_store"] = measure(lambda: analyzer.read_and_score_text_files(folder_name), repeat)
+
+    # searching and ranking what was just loaded
+    queries = words[:3] + words[100:102]
+    results["engine_index"] = measure(lambda: search_engine.SearchEngine().refresh(force=True), repeat)
+    # build the shared index untimed, or the first mode measured would pay for it
+    search_engine.engine.refresh(force=True)
+    for mode in search_engine.MODES:
+        results["engine_" + mode] = measure(
+            lambda: [list(search_engine.search(query, mode)) for query in queries], repeat)
+
+    # pages, rendered through flask's test client
+    config.job_worker_on_first_request = False
+    import app
+    client = app.app.test_client()
+    analyzer.score_corpus(folder_name)
+    results["render_analytics_cold"] = measure(lambda: get_page(client, "/analytics/compact.json"), repeat,
+                                               setup=helper.transcript_cache.clear)
+    results["render_analytics_cached"] = measure(lambda: get_page(client, "/analytics/compact.json"), repeat)
+    results["render_graphsentiment"] = measure(lambda: get_page(client, "/graphsentiment/" + CORPUS), repeat)
+    return results
+
+
+def get_page(client, url):
+    """ a page that has to render, timing an error page instead would make the numbers meaningless """
+    response = client.get(url)
+    if response.status_code != 200:
+        raise SystemExit(url + " answered " + str(response.status_code))
+    return response
+
+
+# ---------------------------------------------------------------------------------------------------- #
+# reporting
+# ---------------------------------------------------------------------------------------------------- #
+
+def print_results(report, baseline=None):
+    for scale, stages in report["results"].items():
+        print(scale)
+        for stage, numbers in stages.items():
+            line = "  %-26s %10.4fs %10.1f KiB" % (stage, numbers["best_seconds"], numbers["peak_bytes"] / 1024.0)
+            old = (baseline or {}).get("results", {}).get(scale, {}).get(stage)
+            if old is not None and old["best_seconds"] > 0:
+                line += "   %5.2fx time  %5.2fx memory" % (numbers["best_seconds"] / old["best_seconds"],
+                                                           numbers["peak_bytes"] / float(max(old["peak_bytes"], 1)))
+            print(line)
+
+
+# ---------------------------------------------------------------------------------------------------- #
+# main method
+# ---------------------------------------------------------------------------------------------------- #
+
+def main():
+    parser = argparse.ArgumentParser(description="time the parse, score, search and render hot paths")
+    parser.add_argument("--scale", nargs="+", choices=sorted(SCALES), default=["small"])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="write the results to this json file")
+    parser.add_argument("--compare", help="a results file from an earlier run to compare against")
+    args = parser.parse_args()
+
+    # nothing in the suite may reach watson
+    helper.new_stt_client = OfflineClient
+    helper.tone_clients = helper.ClientPool(OfflineClient, 1)
+    helper.personality_clients = helper.ClientPool(OfflineClient, 1)
+
+    report = {"meta": {"python": platform.python_version(), "platform": platform.platform(),
+                       "cpus": os.cpu_count(), "time": time.time(), "repeat": args.repeat}, "results": {}}
+    workdir = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        for scale in args.scale:
+            report["results"][scale] = run_scale(scale, args.repeat)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as infile:
+            baseline = json.load(infile)
+    print_results(report, baseline)
+
+    if args.output:
+        with open(args.output, "w") as outfile:
+            json.dump(report, outfile, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Synthetic data for the benchmarks: watson shaped transcripts like the checked in *.json files and text
+folders like test_text/neg_reviews, built from a fixed seed so every run sees the same data
+
+@author Preston Mackert
+"""
+
+# ---------------------------------------------------------------------------------------------------- #
+# imports
+# ---------------------------------------------------------------------------------------------------- #
+
+import json
+import os
+import random
+import string
+
+
+# ---------------------------------------------------------------------------------------------------- #
+# vocabulary
+# ---------------------------------------------------------------------------------------------------- #
+
+# a few words vader has opinions on, mixed into the random ones so scores aren't all zero
+SENTIMENT_WORDS = ["bad", "terrible", "awful", "boring", "hate", "good", "great", "love", "wonderful", "fun"]
+
+
+def vocabulary(size, seed=7):
+    rng = random.Random(seed)
+    words = ["".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(2, 11)))
+             for _ in range(size)]
+    return SENTIMENT_WORDS + words
+
+
+def zipf_weights(size):
+    """ word frequencies that fall off like natural text, a few words common and most rare """
+    return [1.0 / (rank + 1) for rank in range(size)]
+
+
+# ---------------------------------------------------------------------------------------------------- #
+# transcripts
+# ---------------------------------------------------------------------------------------------------- #
+
+def watson_results(num_words, words_per_chunk=20, seed=11):
+    """ a list of results shaped like watson's recognize response, with word confidence """
+    rng = random.Random(seed)
+    words = vocabulary(5000)
+    weights = zipf_weights(len(words))
+    results = []
+    remaining = num_words
+    while remaining > 0:
+        count = min(remaining, rng.randint(words_per_chunk // 2, words_per_chunk * 3 // 2))
+        chunk_words = rng.choices(words, weights, k=count)
+        word_confidence = [[word, round(rng.betavariate(5, 1.5), 3)] for word in chunk_words]
+        results.append({"alternatives": [{"transcript": " ".join(chunk_words) + " ",
+                                          "confidence": round(rng.uniform(0.4, 0.99), 3),
+                                          "word_confidence": word_confidence}], "final": True})
+        remaining -= count
+    return results
+
+
+def write_legacy_transcript(path, results):
+    """ the old on disk format, a json string holding indented json """
+    with open(path, "w") as outfile:
+        json.dump(json.dumps({"results": results, "result_index": 0}, indent=2), outfile)
+
+
+# ---------------------------------------------------------------------------------------------------- #
+# text folders
+# ---------------------------------------------------------------------------------------------------- #
+
+def text_corpus(num_files, lines_per_file=30, words_per_line=12, vocabulary_size=20000, seed=7):
+    """ review shaped files as a dict of file name to lines, plus the vocabulary they were drawn from """
+    rng = random.Random(seed)
+    words = vocabulary(vocabulary_size, seed)
+    weights = zipf_weights(len(words))
+
+    corpus = {}
+    for number in range(num_files):
+        lines = []
+        for _ in range(lines_per_file):
+            lines.append(" ".join(rng.choices(words, weights, k=words_per_line)) + " .\n")
+        corpus["cv%05d.txt" % number] = lines
+    return corpus, words
+
+
+def write_text_folder(folder_name, corpus):
+    if not os.path.isdir(folder_name):
+        os.makedirs(folder_name)
+    for file, lines in corpus.items():
+        with open(os.path.join(folder_name, file), "w") as outfile:
+            outfile.writelines(lines)
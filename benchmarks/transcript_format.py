@@ -0,0 +1,71 @@
+"""
+Compares the old double encoded transcripts against the compact format: size on disk and the time
+convert_json_to_data takes to load each one. run from the repository root:
+
+    python benchmarks/transcript_format.py [transcript.json ...]
+
+@author Preston Mackert
+"""
+
+# ---------------------------------------------------------------------------------------------------- #
+# imports
+# ---------------------------------------------------------------------------------------------------- #
+
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import helper_functions as helper
+import migrate_transcripts
+
+
+# ---------------------------------------------------------------------------------------------------- #
+# support methods
+# ---------------------------------------------------------------------------------------------------- #
+
+def time_load(path, repeat=20):
+    """ best per call time of convert_json_to_data over a few rounds, in milliseconds """
+    timings = timeit.repeat(lambda: helper.convert_json_to_data(path), number=1, repeat=repeat)
+    return min(timings) * 1000
+
+
+def compare(path, workdir):
+    """ copies the transcript, migrates the copy, and measures both """
+    legacy = os.path.join(workdir, "legacy_" + os.path.basename(path))
+    compact = os.path.join(workdir, "compact_" + os.path.basename(path))
+    shutil.copyfile(path, legacy)
+    shutil.copyfile(path, compact)
+    if not migrate_transcripts.migrate_file(compact):
+        return None
+
+    return {"file": os.path.basename(path), "legacy_bytes": os.path.getsize(legacy),
+            "compact_bytes": os.path.getsize(compact), "legacy_ms": time_load(legacy),
+            "compact_ms": time_load(compact)}
+
+
+# ---------------------------------------------------------------------------------------------------- #
+# main method
+# ---------------------------------------------------------------------------------------------------- #
+
+def main():
+    paths = sys.argv[1:] or sorted(name for name in os.listdir(os.getcwd()) if name.endswith(".json"))
+    workdir = tempfile.mkdtemp()
+    try:
+        print("%-16s %12s %12s %10s %10s" % ("file", "old bytes", "new bytes", "old ms", "new ms"))
+        for path in paths:
+            row = compare(path, workdir)
+            if row is None:
+                print("%-16s already compact" % os.path.basename(path))
+                continue
+            print("%-16s %12d %12d %10.3f %10.3f" % (row["file"], row["legacy_bytes"], row["compact_bytes"],
+                                                     row["legacy_ms"], row["compact_ms"]))
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
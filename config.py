@@ -29,3 +29,110 @@ pi_uname = ""
 pi_pword = ""
 pi_url = ""
 pi_ver = ""
+
+# ---------------------------------------------------------------------------------------------------- #
+# batch transcription settings
+# ---------------------------------------------------------------------------------------------------- #
+
+batch_workers = 4
+batch_retries = 3
+batch_backoff = 1.0
+
+# transcribe in fixed size pieces and append each finished segment to a .jsonl file as it arrives
+stream_transcripts = False
+stream_chunk_seconds = 60
+stream_chunk_bytes = 64 * 1024
+
+# the speech recognizer used for transcription, one of "watson", "local" (offline, needs vosk and a
+# model folder) or "fake". batch_workers should be at least local_recognizer_processes to keep every
+# local process busy, None uses every core
+recognizer = "watson"
+local_model_path = "models/vosk-model-small-en-us-0.15"
+local_recognizer_processes = None
+
+# before a wav file is sent it is mixed down to mono, resampled down to the recognizer's rate (or this
+# rate if set), and silences longer than twice the kept seconds are shortened. a window is silent when
+# its rms level is under preprocess_silence_rms (16 bit scale, 300 is about -40 dBFS)
+preprocess_audio = True
+preprocess_sample_rate = None
+preprocess_silence_rms = 300
+preprocess_keep_silence_seconds = 0.5
+
+# ---------------------------------------------------------------------------------------------------- #
+# caching
+# ---------------------------------------------------------------------------------------------------- #
+
+# rough upper bound on memory used by parsed transcripts kept around for the analytics pages
+transcript_cache_bytes = 64 * 1024 * 1024
+
+# ---------------------------------------------------------------------------------------------------- #
+# storage
+# ---------------------------------------------------------------------------------------------------- #
+
+# sqlite catalog of transcripts written by send_batch
+catalog_path = "transcripts.db"
+
+# vader scores of every line of the text folders, reused while the files are unchanged
+score_store_path = "sentiment_scores.json"
+
+# formatted tone and personality results, keyed by a hash of the analyzed text
+analysis_cache_path = "analysis_cache.db"
+
+# queue of background transcription jobs started from /sendfiles
+jobs_path = "jobs.db"
+job_poll_seconds = 2.0
+job_lease_seconds = 300
+
+# start the job worker with the first request a server process handles, whatever the page, so jobs left
+# unfinished by a restart resume without waiting for somebody to open /sendfiles. it is started after
+# any fork (gunicorn --preload), never by importing app.py. turn off to only start it from /sendfiles
+job_worker_on_first_request = True
+
+# ---------------------------------------------------------------------------------------------------- #
+# watson client settings
+# ---------------------------------------------------------------------------------------------------- #
+
+# clients kept per service, and the combined request rate allowed across tone and personality calls
+watson_pool_size = 4
+watson_requests_per_second = 2.0
+watson_burst = 5
+
+# chunked tone analysis sends groups of at least this many words, this many at a time
+tone_chunk_words = 50
+tone_chunk_workers = 4
+
+# text folders that can be analyzed, keyed by the name used in urls
+text_corpora = {"neg_reviews": "test_text/neg_reviews/"}
+
+# processes used to score large text folders, None uses every core
+score_workers = None
+score_chunk_files = 16
+
+# lines per page of the file viewer and results per page of a search, and how many files' line
+# offsets are kept for paging
+view_lines_per_page = 100
+search_results_per_page = 50
+line_index_cache_files = 256
+
+# the search engine checks the text folders and the transcript catalog for new or changed files at most
+# this often, fuzzy matches need at least this fuzz.ratio, and each result lists this many match places
+search_refresh_seconds = 5.0
+search_fuzzy_threshold = 75
+search_match_positions = 20
+
+# ---------------------------------------------------------------------------------------------------- #
+# instrumentation
+# ---------------------------------------------------------------------------------------------------- #
+
+# request and stage timings served at /metrics
+metrics_enabled = True
+
+# share of requests run under cProfile, and the profiles of those slower than the threshold are kept
+profile_sample_rate = 0.0
+profile_threshold_seconds = 1.0
+profile_folder = "profiles"
+
+# load vader, the watson sdk and numpy as soon as app.py is imported instead of on first use. turn on
+# when a server imports the app once and then forks its workers (gunicorn --preload) so they all share
+# one copy
+warm_up_on_import = False
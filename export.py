@@ -0,0 +1,164 @@
+"""
+Bulk export of transcripts and analytics as ndjson or csv. every export is a generator of rows, one
+transcript or text file at a time, so memory use stays flat no matter how many calls there are. the
+same generators back the /export route and the command line:
+
+    python export.py transcripts --format csv --since 2019-01-01 --min-confidence 0.6 > transcripts.csv
+
+@author Preston Mackert
+"""
+
+# ---------------------------------------------------------------------------------------------------- #
+# imports
+# ---------------------------------------------------------------------------------------------------- #
+
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import time
+from datetime import datetime
+import config
+import helper_functions as helper
+import sentiment_analyzer as analyzer
+import transcript_catalog as catalog
+
+
+# ---------------------------------------------------------------------------------------------------- #
+# row generators
+# ---------------------------------------------------------------------------------------------------- #
+
+# a catalogued file that is gone, or that isn't a transcript, is left out rather than ending the export
+# partway through the response
+UNREADABLE = (OSError,) + helper.NOT_A_TRANSCRIPT
+
+def transcript_rows(since=None, until=None, min_confidence=None):
+    """ one row per catalogued transcript with its summary numbers and full text """
+    for entry in catalog.iter_transcripts(since, until, min_confidence):
+        try:
+            data = helper.convert_json_to_data(entry["path"])
+        except UNREADABLE:
+            continue
+        yield {"path": entry["path"], "ingested_at": entry["ingested_at"], "duration": entry["duration"],
+               "word_count": entry["word_count"], "confidence": entry["confidence"],
+               "transcript": data["transcript"]}
+
+
+def word_rows(since=None, until=None, min_confidence=None):
+    """ one row per word of every catalogued transcript, with its position and confidence """
+    for entry in catalog.iter_transcripts(since, until, min_confidence):
+        try:
+            words = helper.convert_json_to_data(entry["path"])["words"]
+        except UNREADABLE:
+            continue
+        for index, (word, confidence) in enumerate(words):
+            yield {"path": entry["path"], "index": index, "word": word, "confidence": confidence}
+
+
+def tone_rows(since=None, until=None, min_confidence=None):
+    """ one row per tone already found for a catalogued transcript. only results sitting in the analysis
+    cache are exported, nothing is sent to watson """
+    for entry in catalog.iter_transcripts(since, until, min_confidence):
+        try:
+            text = helper.convert_json_to_data(entry["path"])["transcript"]
+        except UNREADABLE:
+            continue
+        tones = helper.analysis_cache.get(helper.analysis_cache.key("tone", text))
+        for tone, score in sorted((tones or {}).items()):
+            yield {"path": entry["path"], "tone": tone, "score": score}
+
+
+def sentiment_rows(since=None, until=None, min_confidence=None):
+    """ one row per line of every text corpus with its vader score, for files modified in [since, until).
+    scores come from the score store, so only new or changed files are scored """
+    for corpus, folder_name in sorted(config.text_corpora.items()):
+        if not os.path.isdir(folder_name):
+            continue
+        for file, line_scores in analyzer.score_stream(folder_name, store=analyzer.score_store):
+            modified = os.path.getmtime(os.path.join(folder_name, file))
+            if (since is not None and modified < since) or (until is not None and modified >= until):
+                continue
+            for line, score in enumerate(line_scores):
+                yield {"corpus": corpus, "file": file, "line": line, "compound": score}
+
+
+EXPORTS = {
+    "transcripts": (transcript_rows, ["path", "ingested_at", "duration", "word_count", "confidence", "transcript"]),
+    "words": (word_rows, ["path", "index", "word", "confidence"]),
+    "tones": (tone_rows, ["path", "tone", "score"]),
+    "sentiment": (sentiment_rows, ["corpus", "file", "line", "compound"]),
+}
+
+FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+# ---------------------------------------------------------------------------------------------------- #
+# encoding
+# ---------------------------------------------------------------------------------------------------- #
+
+def as_ndjson(rows):
+    for row in rows:
+        yield json.dumps(row) + "\n"
+
+
+def as_csv(rows, columns):
+    """ the header line followed by one line per row, each encoded as soon as it is produced """
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns)
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+    yield buffer.getvalue()
+
+
+def export(kind, export_format="ndjson", since=None, until=None, min_confidence=None):
+    """ the encoded lines of an export, raises ValueError for an unknown kind or format """
+    if kind not in EXPORTS:
+        raise ValueError("unknown export " + repr(kind) + ", expected one of " + ", ".join(sorted(EXPORTS)))
+    if export_format not in FORMATS:
+        raise ValueError("unknown format " + repr(export_format) + ", expected ndjson or csv")
+
+    row_generator, columns = EXPORTS[kind]
+    rows = row_generator(since, until, min_confidence)
+    return as_csv(rows, columns) if export_format == "csv" else as_ndjson(rows)
+
+
+def parse_time(value):
+    """ accepts a unix timestamp or an iso date (2019-02-18) or datetime, None stays None """
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return time.mktime(datetime.fromisoformat(value).timetuple())
+
+
+# ---------------------------------------------------------------------------------------------------- #
+# main method
+# ---------------------------------------------------------------------------------------------------- #
+
+def main():
+    parser = argparse.ArgumentParser(description="stream transcripts and analytics as ndjson or csv")
+    parser.add_argument("kind", choices=sorted(EXPORTS))
+    parser.add_argument("--format", choices=sorted(FORMATS), default="ndjson")
+    parser.add_argument("--since", help="unix time or iso date, inclusive")
+    parser.add_argument("--until", help="unix time or iso date, exclusive")
+    parser.add_argument("--min-confidence", type=float, help="only transcripts at least this confident")
+    args = parser.parse_args()
+
+    for chunk in export(args.kind, args.format, parse_time(args.since), parse_time(args.until),
+                        args.min_confidence):
+        sys.stdout.write(chunk)
+
+
+# ---------------------------------------------------------------------------------------------------- #
+# call main
+# ---------------------------------------------------------------------------------------------------- #
+
+if __name__ == "__main__":
+    main()
@@ -11,60 +11,308 @@ analysis and personality insights features as well.
 
 import json
 import os
-from os.path import join, dirname
+import struct
+import tempfile
+import threading
+import time
+import wave
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from io import BytesIO
+from os.path import join
+import audio_preprocess
 import config
-from watson_developer_cloud import SpeechToTextV1
-from watson_developer_cloud import ToneAnalyzerV3
-from watson_developer_cloud import PersonalityInsightsV3
+import metrics
+import recognizers
+import transcript_catalog
+import transcript_format
+from watson_clients import ClientPool, ResultCache, TokenBucket, watson_sdk
+from word_confidences import WordConfidences, load_numpy
 
 
 # ---------------------------------------------------------------------------------------------------- #
 # support functions for speech to text
 # ---------------------------------------------------------------------------------------------------- #
 
-def get_transcript(audio_file_name, file_type, folder):
-    """ given an audio file and file type, outputs the file into a json file using IBM watson SDK
+def warm_up():
+    """ imports the watson sdk and numpy ahead of the first request that needs them """
+    watson_sdk()
+    load_numpy()
+
+
+def new_stt_client():
+    """ builds the speech recognizer chosen in config, watson's speech to text unless set otherwise """
+    return recognizers.new_recognizer()
+
+
+# ---------------------------------------------------------------------------------------------------- #
+
+def get_transcript(audio_file_name, file_type, folder, speech_to_text=None):
+    """ given an audio file and file type, outputs the file into a json file using the recognizer chosen
+    in config (IBM watson unless set otherwise), see recognizers.py
     https://github.com/watson-developer-cloud/python-sdk/blob/master/examples/speech_to_text_v1.py """
-    speech_to_text = SpeechToTextV1(username=config.stt_uname, password=config.stt_pword, url=config.stt_url)
+    if speech_to_text is None:
+        speech_to_text = new_stt_client()
 
     # opens the audio file and gathers the transcript result with word confidence
-    with open(join(dirname(os.getcwd() + "/" + folder + "/"), audio_file_name), "rb") as audio_file:
-        result = json.dumps(speech_to_text.recognize(audio=audio_file, content_type="audio/" + file_type,
-                                                     timestamps=False, word_confidence=True), indent=2)
+    with open(join(os.getcwd(), folder, audio_file_name), "rb") as audio_file:
+        with metrics.span("recognize", backend=getattr(speech_to_text, "name", None) or "watson"):
+            result = speech_to_text.recognize(audio=audio_file, content_type="audio/" + file_type,
+                                              timestamps=False, word_confidence=True)
 
-    # writes the result into a json file
+    # writes the result into a compact json file
     output_filename = audio_file_name.replace(file_type, "json")
-    with open(output_filename, "w") as outfile:
-        json.dump(result, outfile)
+    transcript_format.write_compact(output_filename, result.get("results", []))
+    return output_filename
 
 
 # ---------------------------------------------------------------------------------------------------- #
 
-def send_batch(folder):
-    """ takes a folder of audio files and converts them all into json transcripts """
+def read_in_chunks(audio_file, chunk_bytes):
+    """ yields the audio file piece by piece so requests uploads it with chunked transfer encoding """
+    while True:
+        data = audio_file.read(chunk_bytes)
+        if not data:
+            return
+        yield data
+
+
+def split_wav(audio_file, chunk_seconds):
+    """ cuts an open pcm wav file into standalone wav segments of at most chunk_seconds each, only one
+    segment is held in memory at a time. raises wave.Error for compressed wav files """
+    source = wave.open(audio_file, "rb")
+    params = source.getparams()
+    frames_per_chunk = max(1, int(params.framerate * chunk_seconds))
+
+    def segments():
+        with source:
+            while True:
+                frames = source.readframes(frames_per_chunk)
+                if not frames:
+                    return
+                segment = BytesIO()
+                with wave.open(segment, "wb") as sink:
+                    sink.setparams(params)
+                    sink.writeframes(frames)
+                segment.seek(0)
+                yield segment
+
+    return segments()
+
+
+def stream_transcript(audio_file_name, file_type, folder, speech_to_text=None):
+    """ like get_transcript, but sends the audio in pieces and appends every finalized result to a json
+    lines file as soon as it comes back, so memory stays flat and the partial transcript can be read
+    while a long call is still being processed """
+    if speech_to_text is None:
+        speech_to_text = new_stt_client()
+
+    output_filename = audio_file_name.replace(file_type, "jsonl")
+    with open(join(os.getcwd(), folder, audio_file_name), "rb") as audio_file, \
+            open(output_filename, "w") as outfile:
+        # pcm wav files can be cut into independent segments, anything else goes up as one chunked upload
+        segments = None
+        if file_type == "wav":
+            try:
+                segments = split_wav(audio_file, config.stream_chunk_seconds)
+            except (wave.Error, EOFError):
+                audio_file.seek(0)
+        if segments is None:
+            segments = [read_in_chunks(audio_file, config.stream_chunk_bytes)]
+
+        for segment in segments:
+            with metrics.span("recognize", backend=getattr(speech_to_text, "name", None) or "watson"):
+                response = speech_to_text.recognize(audio=segment, content_type="audio/" + file_type,
+                                                    timestamps=False, word_confidence=True)
+            for result in response.get("results", []):
+                if result.get("final", True):
+                    outfile.write(json.dumps(result) + "\n")
+            outfile.flush()
+
+    return output_filename
+
+
+# ---------------------------------------------------------------------------------------------------- #
+
+# each batch worker thread holds on to a single client for every file it transcribes
+_batch_worker = threading.local()
+
+
+def _init_batch_worker(client_factory):
+    """ builds the client the calling worker thread reuses, the first time the thread picks up a file.
+    it is built inside the file's task rather than as the pool's initializer, so a factory that raises
+    (the local recognizer without vosk or its model) fails the file instead of breaking the pool """
+    if getattr(_batch_worker, "factory", None) is not client_factory:
+        _batch_worker.client = client_factory()
+        _batch_worker.factory = client_factory
+
+
+def transcribe_with_retry(audio_file_name, folder, retries, backoff):
+    """ transcribes a single file with the calling worker's client, retrying with exponential backoff.
+    when preprocessing is on the file is first shrunk into a scratch folder and that copy is sent, and
+    the preprocessing report is returned """
+    filename, file_extension = os.path.splitext(audio_file_name)
+    file_extension = file_extension.replace(".", "")
+    transcribe = stream_transcript if config.stream_transcripts else get_transcript
+    report = None
+    with tempfile.TemporaryDirectory() as scratch_folder:
+        source_folder = folder
+        if config.preprocess_audio:
+            sample_rate = config.preprocess_sample_rate or getattr(_batch_worker.client, "sample_rate", None)
+            with metrics.span("preprocess"):
+                audio_path, report = audio_preprocess.prepare_audio(os.path.join(folder, audio_file_name),
+                                                                    scratch_folder, sample_rate)
+            source_folder = os.path.dirname(audio_path)
+            report_preprocessing(audio_file_name, report)
+
+        attempt = 0
+        while True:
+            try:
+                output_filename = transcribe(audio_file_name, file_extension, source_folder,
+                                             speech_to_text=_batch_worker.client)
+                break
+            except Exception:
+                attempt += 1
+                if attempt > retries:
+                    metrics.increment("speech_transcriptions_failed_total")
+                    raise
+                metrics.increment("speech_transcription_retries_total")
+                time.sleep(backoff * 2 ** (attempt - 1))
+
+    # the transcript is written by now, so a problem cataloguing it is reported without failing the file
     try:
-        for audio_file in os.listdir(folder):
-            filename, file_extension = os.path.splitext(audio_file)
-            file_extension = file_extension.replace(".", "")
-            print("transcribing " + filename + "." + file_extension + "...")
-            get_transcript(filename + "." + file_extension, file_extension, folder)
+        register_transcript(output_filename, audio_duration(os.path.join(folder, audio_file_name)))
+    except Exception as failure:
+        metrics.increment("speech_catalog_failures_total")
+        print("transcribed " + audio_file_name + " but could not catalog " + output_filename + ": " +
+              str(failure))
+    return report
+
+
+def report_preprocessing(audio_file_name, report):
+    if "skipped" in report:
+        print("sending " + audio_file_name + " as it is: " + report["skipped"])
+        return
+    metrics.increment("speech_audio_bytes_saved_total", report["bytes_saved"])
+    metrics.increment("speech_audio_seconds_saved_total", report["seconds_saved"])
+    print("preprocessed %s: %.2f MB to %.2f MB, %.1fs to %.1fs" % (
+        audio_file_name, report["bytes_before"] / 1e6, report["bytes_after"] / 1e6, report["seconds_before"],
+        report["seconds_after"]))
+
 
-    except:
+# ---------------------------------------------------------------------------------------------------- #
+
+def send_batch(folder, workers=None, retries=None, backoff=None, client_factory=None, files=None,
+               on_start=None, on_result=None):
+    """ takes a folder of audio files and converts them all into json transcripts, spreading the files
+    over a bounded pool of workers. returns a summary of which files succeeded, which failed, and what
+    preprocessing saved on each.
+    files limits the batch to some of the folder's files, on_start(file) is called as a worker picks a
+    file up and on_result(file, error) once it is finished, with error None on success """
+    workers = workers or config.batch_workers
+    retries = config.batch_retries if retries is None else retries
+    backoff = config.batch_backoff if backoff is None else backoff
+    client_factory = client_factory or new_stt_client
+
+    summary = {"succeeded": [], "failed": {}, "preprocessed": {}}
+    try:
+        audio_files = sorted(os.listdir(folder)) if files is None else list(files)
+    except OSError:
         print("invalid folder")
+        return summary
+
+    def transcribe(audio_file):
+        if on_start is not None:
+            on_start(audio_file)
+        _init_batch_worker(client_factory)
+        return transcribe_with_retry(audio_file, folder, retries, backoff)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = {}
+        for audio_file in audio_files:
+            print("transcribing " + audio_file + "...")
+            pending[pool.submit(transcribe, audio_file)] = audio_file
+
+        for future in as_completed(pending):
+            audio_file = pending[future]
+            try:
+                report = future.result()
+                summary["succeeded"].append(audio_file)
+                if report is not None:
+                    summary["preprocessed"][audio_file] = report
+                error = None
+            except Exception as failure:
+                print("failed to transcribe " + audio_file + ": " + str(failure))
+                summary["failed"][audio_file] = str(failure)
+                error = str(failure)
+            if on_result is not None:
+                on_result(audio_file, error)
+
+    print("transcribed " + str(len(summary["succeeded"])) + " files, " + str(len(summary["failed"])) +
+          " failed")
+    return summary
 
 
 # ---------------------------------------------------------------------------------------------------- #
 
-def convert_json_to_data(json_file):
-    """ takes in a json file and reads it into pythonic data, reformated for easier reading """
-    json_data = json.loads(open(json_file).read())
-    formatted_dict = json.loads(json_data)
-    results = formatted_dict.get("results")
+def read_transcript_lines(jsonl_file):
+    """ yields the results stored in a json lines transcript one at a time, a half written last line
+    from a transcription still in progress is skipped """
+    with open(jsonl_file) as infile:
+        for line in infile:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                return
+
+
+def load_results(json_file):
+    """ reads a transcript in any of the stored formats. json lines and old style json transcripts come
+    back as the list of watson results, compact transcripts come back as the compact dict """
+    if json_file.endswith(".jsonl"):
+        return list(read_transcript_lines(json_file))
+    return transcript_format.read_transcript_file(json_file)
+
+
+# ---------------------------------------------------------------------------------------------------- #
+
+def convert_compact_to_data(compact):
+    """ the compact format is already flat, so only the transcript, overall confidence, and chunk ranges
+    need building """
+    confidences = compact["confidences"]
+    chunks = []
+    start = 0
+    for transcript, confidence, count in zip(compact["transcripts"], confidences, compact["word_counts"]):
+        chunks.append({"transcript": transcript, "confidence": confidence, "start": start, "end": start + count})
+        start += count
+
+    return {"transcript": "".join(compact["transcripts"]), "confidence": average_confidence(confidences),
+            "words": WordConfidences(compact["words"], compact["word_confidences"]), "chunks": chunks}
 
+
+def average_confidence(confidences):
+    """ the mean of the chunk confidences, 0.0 for a transcript without any chunks (a silent call) """
+    return sum(confidences) / len(confidences) if confidences else 0.0
+
+
+def convert_json_to_data(json_file):
+    """ takes in a json file and reads it into pythonic data, reformated for easier reading. words are a
+    WordConfidences, and each chunk keeps its own transcript and confidence along with the start and end
+    of its words in that sequence """
+    results = load_results(json_file)
+    with metrics.span("transcript_convert"):
+        if transcript_format.is_compact(results):
+            return convert_compact_to_data(results)
+        return convert_results_to_data(results)
+
+
+def convert_results_to_data(results):
+    """ the stitching half of convert_json_to_data, for a list of watson results """
     # watson's json response breaks data up into partial dictionaries and needs to be restitched
-    word_confidence_hub = []
+    words = []
+    word_confidences = []
     partial_confidence_hub = []
-    full_transcript = ""
+    transcript_parts = []
     chunks = []
 
     # commence the stitching
@@ -79,37 +327,255 @@ def convert_json_to_data(json_file):
 
         # stitch partial content into larger data sets
         partial_confidence_hub.append(partial_confidence)
-        full_transcript += partial_transcript
-        # the word confidence is nested... un-nesting it
-        for word in word_confidence:
-            word_confidence_hub.append(word)
+        transcript_parts.append(partial_transcript)
 
-        # add the partial_dict for reference purposes
-        chunks.append(partial_dict)
+        # the word confidence is nested... un-nesting it, and remembering which words were this chunk's
+        start = len(words)
+        for word, conf in word_confidence:
+            words.append(word)
+            word_confidences.append(conf)
+        chunks.append({"transcript": partial_transcript, "confidence": partial_confidence, "start": start,
+                       "end": len(words)})
 
     # calculating the overall confidence level from partial confidences
-    confidence = sum(partial_confidence_hub) / len(partial_confidence_hub)
+    confidence = average_confidence(partial_confidence_hub)
 
     # reconstructing the dictionary into something more useful and returning
-    return {"transcript": full_transcript, "confidence": confidence, "words": word_confidence_hub, "chunks": chunks}
+    return {"transcript": "".join(transcript_parts), "confidence": confidence,
+            "words": WordConfidences(words, word_confidences), "chunks": chunks}
+
+
+# ---------------------------------------------------------------------------------------------------- #
+
+class TranscriptCache(object):
+    """ least recently used cache of parsed transcripts. entries are keyed by path and only reused while
+    the file's mtime and size are unchanged, and the oldest are dropped once max_bytes is passed """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, path, loader):
+        """ returns loader(path), parsing the file again only if it changed since it was cached """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        key = (stat.st_mtime_ns, stat.st_size)
+
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is not None and entry[0] == key:
+                self.entries.move_to_end(path)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        data = loader(path)
+        cost = estimate_transcript_bytes(data)
+        with self.lock:
+            old_entry = self.entries.pop(path, None)
+            if old_entry is not None:
+                self.current_bytes -= old_entry[2]
+            if cost <= self.max_bytes:
+                self.entries[path] = (key, data, cost)
+                self.current_bytes += cost
+            while self.current_bytes > self.max_bytes:
+                _, (_, _, old_cost) = self.entries.popitem(last=False)
+                self.current_bytes -= old_cost
+        return data
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self.entries),
+                    "bytes": self.current_bytes, "max_bytes": self.max_bytes}
+
+
+def estimate_transcript_bytes(data):
+    """ rough in memory size of a converted transcript, chunks cost about their dict and transcript """
+    return 2 * len(data["transcript"]) + data["words"].nbytes() + 256 * len(data["chunks"])
+
+
+transcript_cache = TranscriptCache(config.transcript_cache_bytes)
+metrics.register("speech_transcript_cache_hits_total", lambda: transcript_cache.hits, "counter",
+                 "transcripts served from the parsed transcript cache")
+metrics.register("speech_transcript_cache_misses_total", lambda: transcript_cache.misses, "counter",
+                 "transcripts parsed from disk because they were not cached or had changed")
+metrics.register("speech_transcript_cache_bytes", lambda: transcript_cache.current_bytes, "gauge",
+                 "estimated size of the parsed transcripts held in the cache")
+
+
+def load_transcript(json_file):
+    """ convert_json_to_data through the transcript cache, the returned dict is shared and must not be
+    modified by the caller """
+    return transcript_cache.get(json_file, convert_json_to_data)
+
+
+# ---------------------------------------------------------------------------------------------------- #
+# support functions for the transcript catalog
+# ---------------------------------------------------------------------------------------------------- #
+
+def audio_duration(audio_path):
+    """ length of a wav file in seconds taken from its header, works for compressed wav files too since
+    it only needs the byte rate and the size of the data chunk. returns None for anything else """
+    try:
+        with open(audio_path, "rb") as audio_file:
+            riff, _, wave_id = struct.unpack("<4sI4s", audio_file.read(12))
+            if riff != b"RIFF" or wave_id != b"WAVE":
+                return None
+            byte_rate = None
+            while True:
+                header = audio_file.read(8)
+                if len(header) < 8:
+                    return None
+                chunk_id, chunk_size = struct.unpack("<4sI", header)
+                if chunk_id == b"fmt ":
+                    byte_rate = struct.unpack("<HHII", audio_file.read(12))[3]
+                    audio_file.seek(chunk_size - 12 + chunk_size % 2, 1)
+                elif chunk_id == b"data":
+                    return chunk_size / byte_rate if byte_rate else None
+                else:
+                    audio_file.seek(chunk_size + chunk_size % 2, 1)
+    except (OSError, struct.error):
+        return None
+
+
+# what converting a json file that isn't a transcript can raise
+NOT_A_TRANSCRIPT = (ValueError, TypeError, AttributeError, KeyError, IndexError, ZeroDivisionError)
+
+
+def register_transcript(json_file, duration=None, ingested_at=None):
+    """ records a freshly written transcript and its summary numbers in the catalog """
+    data = convert_json_to_data(json_file)
+    transcript_catalog.record_transcript(json_file, len(data["words"]), data["confidence"], duration=duration,
+                                         ingested_at=ingested_at)
+
+
+def register_existing_transcripts(folder, db_path=None):
+    """ one time backfill of the catalog from the transcripts already sitting in a folder, returns how
+    many were added. files that are not transcripts are left out """
+    added = 0
+    for json_file in sorted(os.listdir(folder)):
+        if not (json_file.endswith(".json") or json_file.endswith(".jsonl")):
+            continue
+        path = os.path.join(folder, json_file)
+        try:
+            data = convert_json_to_data(path)
+        except NOT_A_TRANSCRIPT:
+            continue
+        # relative to the working directory, where the pages and the export open transcripts from
+        transcript_catalog.record_transcript(os.path.relpath(path), len(data["words"]), data["confidence"],
+                                             ingested_at=os.path.getmtime(path), db_path=db_path)
+        added += 1
+    return added
 
 
 # ---------------------------------------------------------------------------------------------------- #
 # support functions for tone analysis 
 # ---------------------------------------------------------------------------------------------------- #
 
+def new_tone_client():
+    return watson_sdk().ToneAnalyzerV3(username=config.tone_uname, password=config.tone_pword,
+                                       url=config.tone_url, version=config.tone_vers)
+
+
+def new_personality_client():
+    return watson_sdk().PersonalityInsightsV3(version=config.pi_ver, username=config.pi_uname,
+                                              password=config.pi_pword, url=config.pi_url)
+
+
+# long lived clients shared by every request, one rate limit across both services, and the results of
+# every text already analyzed so a repeat view never goes back to watson
+tone_clients = ClientPool(new_tone_client, config.watson_pool_size)
+personality_clients = ClientPool(new_personality_client, config.watson_pool_size)
+watson_rate_limit = TokenBucket(config.watson_requests_per_second, config.watson_burst)
+analysis_cache = ResultCache(config.analysis_cache_path)
+metrics.register("speech_analysis_cache_hits_total", lambda: analysis_cache.hits, "counter",
+                 "tone and personality results served without calling watson")
+metrics.register("speech_analysis_cache_misses_total", lambda: analysis_cache.misses, "counter",
+                 "tone and personality results that had to be requested from watson")
+
+
 def analyze_tone(text):
     """ given some text, send it to IBM Watson's tone analysis tool
     https://github.com/watson-developer-cloud/python-sdk/blob/master/examples/tone_analyzer_v3.py """
-    tone_analyzer = ToneAnalyzerV3(username=config.tone_uname, password=config.tone_pword, url=config.tone_url,
-                                   version=config.tone_vers)
-
-    json_data = json.dumps(tone_analyzer.tone(tone_input=text, content_type="text/plain"), indent=2)
-    formatted_dict = json.loads(json_data)
-    tones = format_tone(formatted_dict)
+    key = analysis_cache.key("tone", text)
+    tones = analysis_cache.get(key)
+    if tones is not None:
+        return tones
+
+    with metrics.span("watson_rate_limit_wait"):
+        watson_rate_limit.acquire()
+    with tone_clients.client() as tone_analyzer, metrics.span("watson_tone"):
+        tones = format_tone(tone_analyzer.tone(tone_input=text, content_type="text/plain"))
+    analysis_cache.put(key, tones)
     return tones
 
 
+# ---------------------------------------------------------------------------------------------------- #
+
+def group_chunks(chunks, min_words):
+    """ joins consecutive transcript chunks until each group has at least min_words words, so very short
+    chunks don't each cost a tone call. groups never split a chunk """
+    groups = []
+    current = None
+    for chunk in chunks:
+        if current is None:
+            current = {"transcript": "", "start": chunk["start"], "end": chunk["start"], "words": 0}
+        current["transcript"] += chunk["transcript"]
+        current["end"] = chunk["end"]
+        # chunks without word confidence data still count by their number of words
+        current["words"] += chunk["end"] - chunk["start"] or len(chunk["transcript"].split())
+        if current["words"] >= min_words:
+            groups.append(current)
+            current = None
+    if current is not None:
+        # a short tail is folded into the group before it rather than sent on its own
+        if groups:
+            groups[-1]["transcript"] += current["transcript"]
+            groups[-1]["end"] = current["end"]
+            groups[-1]["words"] += current["words"]
+        else:
+            groups.append(current)
+    return [group for group in groups if group["transcript"].strip()]
+
+
+def analyze_tone_chunks(chunks, max_workers=None, min_words=None):
+    """ runs tone analysis on every group of transcript chunks at the same time (up to max_workers calls
+    in flight) and merges the results. returns the document tones as the word weighted mean of each tone
+    over the chunks it was found in, the share of words covered by chunks showing each tone, and the
+    per chunk tones in order as a timeline """
+    max_workers = max_workers or config.tone_chunk_workers
+    min_words = config.tone_chunk_words if min_words is None else min_words
+    groups = group_chunks(chunks, min_words)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        chunk_tones = list(pool.map(analyze_tone, [group["transcript"] for group in groups]))
+
+    weighted_sums = {}
+    weights = {}
+    total_words = 0
+    timeline = []
+    for group, tones in zip(groups, chunk_tones):
+        words = group["words"]
+        total_words += words
+        for tone, score in tones.items():
+            weighted_sums[tone] = weighted_sums.get(tone, 0) + score * words
+            weights[tone] = weights.get(tone, 0) + words
+        timeline.append({"start": group["start"], "end": group["end"], "tones": tones})
+
+    document = {tone: weighted_sums[tone] / weights[tone] for tone in weighted_sums}
+    coverage = {tone: float(weights[tone]) / total_words for tone in weights}
+    return {"document": document, "coverage": coverage, "timeline": timeline}
+
+
 # ---------------------------------------------------------------------------------------------------- #
 
 def format_tone(data):
@@ -132,13 +598,18 @@ def format_tone(data):
 def analyze_personality(text):
     """ given some text, send it to IBM Watson's personality insight tool, requires at least 100 words
     https://github.com/watson-developer-cloud/python-sdk """
-    personality_insights = PersonalityInsightsV3(version=config.pi_ver, username=config.pi_uname,
-                                                 password=config.pi_pword, url=config.pi_url)
-    json_data = json.dumps(
-        personality_insights.profile(text, content_type='text/plain', raw_scores=True, consumption_preferences=True),
-        indent=2)
-    formatted_dict = json.loads(json_data)
-    personality_profile = format_personality(formatted_dict)
+    key = analysis_cache.key("personality", text)
+    personality_profile = analysis_cache.get(key)
+    if personality_profile is not None:
+        return personality_profile
+
+    with metrics.span("watson_rate_limit_wait"):
+        watson_rate_limit.acquire()
+    with personality_clients.client() as personality_insights, metrics.span("watson_personality"):
+        profile = personality_insights.profile(text, content_type='text/plain', raw_scores=True,
+                                               consumption_preferences=True)
+    personality_profile = format_personality(profile)
+    analysis_cache.put(key, personality_profile)
     return personality_profile
 
 
@@ -0,0 +1,101 @@
+"""
+Paged reading of text files. the byte offset of every line start is found once per file and kept, so
+any page of lines is a single seek and read no matter how far into the file it is
+
+@author Preston Mackert
+"""
+
+# ---------------------------------------------------------------------------------------------------- #
+# imports
+# ---------------------------------------------------------------------------------------------------- #
+
+import os
+import threading
+from array import array
+from collections import OrderedDict
+import config
+
+
+# ---------------------------------------------------------------------------------------------------- #
+# line offsets
+# ---------------------------------------------------------------------------------------------------- #
+
+READ_BYTES = 1024 * 1024
+
+
+def line_offsets(path):
+    """ the byte offset each line starts at, plus the file's size at the end, so line n is the bytes
+    between offsets[n] and offsets[n + 1] """
+    offsets = array("Q", [0])
+    position = 0
+    with open(path, "rb") as infile:
+        while True:
+            block = infile.read(READ_BYTES)
+            if not block:
+                break
+            newline = block.find(b"\n")
+            while newline != -1:
+                offsets.append(position + newline + 1)
+                newline = block.find(b"\n", newline + 1)
+            position += len(block)
+    # a last line without a newline still counts as a line
+    if offsets[-1] != position:
+        offsets.append(position)
+    return offsets
+
+
+class LineIndexCache(object):
+    """ the line offsets of the most recently read files, only reused while a file's mtime and size are
+    unchanged """
+
+    def __init__(self, max_files):
+        self.max_files = max_files
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, path):
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        key = (stat.st_mtime_ns, stat.st_size)
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is not None and entry[0] == key:
+                self.entries.move_to_end(path)
+                return entry[1]
+
+        offsets = line_offsets(path)
+        with self.lock:
+            self.entries[path] = (key, offsets)
+            self.entries.move_to_end(path)
+            while len(self.entries) > self.max_files:
+                self.entries.popitem(last=False)
+        return offsets
+
+
+line_indexes = LineIndexCache(config.line_index_cache_files)
+
+
+# ---------------------------------------------------------------------------------------------------- #
+# pages
+# ---------------------------------------------------------------------------------------------------- #
+
+def read_page(path, cursor=0, limit=None):
+    """ up to limit lines starting at line number cursor, read with one seek. returns the lines along with
+    the cursors of the pages before and after (None at either end) and the file's total line count """
+    limit = limit or config.view_lines_per_page
+    offsets = line_indexes.get(path)
+    total = len(offsets) - 1
+    start = min(max(cursor, 0), total)
+    end = min(start + limit, total)
+
+    base = offsets[start]
+    with open(path, "rb") as infile:
+        infile.seek(base)
+        block = infile.read(offsets[end] - base)
+    lines = [block[offsets[line] - base:offsets[line + 1] - base].decode("utf-8", errors="replace")
+             for line in range(start, end)]
+
+    previous_cursor = max(start - limit, 0) if start > 0 else None
+    next_cursor = end if end < total else None
+    return {"lines": lines, "start": start, "end": end, "total": total, "previous": previous_cursor,
+            "next": next_cursor}
@@ -0,0 +1,246 @@
+"""
+Timers, counters and a slow request profiler for the app. modules time their own stages with span()
+and don't need to know about flask, app.py times whole requests and serves everything in the
+prometheus text format at /metrics. numbers are kept per process, so with several server workers each
+one reports its own
+
+@author Preston Mackert
+"""
+
+# ---------------------------------------------------------------------------------------------------- #
+# imports
+# ---------------------------------------------------------------------------------------------------- #
+
+import bisect
+import cProfile
+import functools
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+import config
+
+
+# ---------------------------------------------------------------------------------------------------- #
+# registry
+# ---------------------------------------------------------------------------------------------------- #
+
+# upper bounds in seconds of the latency histogram buckets, the last bucket (+Inf) is implied
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+REQUEST_SECONDS = "speech_request_seconds"
+STAGE_SECONDS = "speech_stage_seconds"
+STAGE_ERRORS = "speech_stage_errors_total"
+
+HELP = {
+    REQUEST_SECONDS: "time spent handling a request, by route, method and status",
+    STAGE_SECONDS: "time spent in one stage of the work behind a request, such as json decoding or a "
+                   "watson call",
+    STAGE_ERRORS: "stages that ended with an exception",
+    "speech_audio_bytes_saved_total": "bytes of audio not uploaded thanks to preprocessing",
+    "speech_audio_seconds_saved_total": "seconds of audio not sent for recognition thanks to preprocessing",
+    "speech_catalog_failures_total": "transcripts written but left out of the catalog because of an error",
+    "speech_profiles_written_total": "slow requests whose profile was written to the profile folder",
+    "speech_text_files_total": "text files read in, by whether vader scored them or the score store had them",
+    "speech_transcription_retries_total": "transcription attempts that failed and were retried",
+    "speech_transcriptions_failed_total": "audio files that could not be transcribed after every retry",
+}
+
+
+class Registry(object):
+    """ thread safe store of counters and latency histograms, each keyed by a metric name and a set of
+    labels, plus gauges that are read from a callback whenever the metrics are rendered """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counters = {}
+        self.histograms = {}
+        self.callbacks = {}
+        self.lock = threading.Lock()
+
+    def increment(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        """ adds one measurement to a histogram, its bucket counts are stored uncumulated """
+        key = (name, tuple(sorted(labels.items())))
+        bucket = bisect.bisect_left(self.buckets, seconds)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            histogram[0][bucket] += 1
+            histogram[1] += seconds
+            histogram[2] += 1
+
+    def register(self, name, read, kind="gauge", description=None):
+        """ exposes the number returned by read() under name each time the metrics are rendered, for
+        values another object already keeps track of, like a cache's size """
+        with self.lock:
+            self.callbacks[name] = (read, kind)
+        if description:
+            HELP.setdefault(name, description)
+
+    def clear(self):
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def render(self):
+        """ every metric in the prometheus text exposition format """
+        with self.lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(self.histograms.items(), key=lambda item: item[0])
+            callbacks = sorted(self.callbacks.items())
+
+        lines = []
+        described = set()
+
+        def describe(name, kind):
+            if name not in described:
+                described.add(name)
+                if name in HELP:
+                    lines.append("# HELP " + name + " " + HELP[name])
+                lines.append("# TYPE " + name + " " + kind)
+
+        for (name, labels), value in counters:
+            describe(name, "counter")
+            lines.append(name + format_labels(labels) + " " + format_value(value))
+
+        for (name, labels), (counts, total, count) in histograms:
+            describe(name, "histogram")
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(name + "_bucket" + format_labels(labels + (("le", le),)) + " " + str(cumulative))
+            lines.append(name + "_sum" + format_labels(labels) + " " + format_value(total))
+            lines.append(name + "_count" + format_labels(labels) + " " + str(count))
+
+        for name, (read, kind) in callbacks:
+            try:
+                value = read()
+            except Exception:
+                continue
+            describe(name, kind)
+            lines.append(name + " " + format_value(value))
+
+        return "\n".join(lines) + "\n"
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    pairs = []
+    for key, value in labels:
+        value = str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+        pairs.append(key + "=\"" + value + "\"")
+    return "{" + ",".join(pairs) + "}"
+
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+registry = Registry()
+
+
+# ---------------------------------------------------------------------------------------------------- #
+# timing
+# ---------------------------------------------------------------------------------------------------- #
+
+@contextmanager
+def span(stage, **labels):
+    """ times the block as one stage, and counts it as an error if an exception leaves it. spans can be
+    nested, each one records its own total time including the spans inside it """
+    if not config.metrics_enabled:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        registry.increment(STAGE_ERRORS, stage=stage, **labels)
+        raise
+    finally:
+        registry.observe(STAGE_SECONDS, time.perf_counter() - start, stage=stage, **labels)
+
+
+def timed(stage):
+    """ decorator form of span for functions that are a stage from start to finish """
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def increment(name, value=1, **labels):
+    if config.metrics_enabled:
+        registry.increment(name, value, **labels)
+
+
+def observe(name, seconds, **labels):
+    if config.metrics_enabled:
+        registry.observe(name, seconds, **labels)
+
+
+def register(name, read, kind="gauge", description=None):
+    registry.register(name, read, kind, description)
+
+
+def render():
+    return registry.render()
+
+
+# ---------------------------------------------------------------------------------------------------- #
+# profiling
+# ---------------------------------------------------------------------------------------------------- #
+
+class SlowCallProfiler(object):
+    """ runs cProfile on a random sample of calls and writes out the profile of any that took longer
+    than threshold seconds, so the slow ones can be read with pstats or snakeviz later. a sample rate of
+    0 turns it off """
+
+    def __init__(self, sample_rate, threshold, folder):
+        self.sample_rate = sample_rate
+        self.threshold = threshold
+        self.folder = folder
+
+    def start(self):
+        """ a running profile for this call, or None when the call isn't sampled """
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # another profiler is already active on this thread
+            return None
+        return profile
+
+    def stop(self, profile, name, elapsed):
+        """ stops the profile from start and returns the path it was written to, or None if the call was
+        quick enough not to keep it """
+        if profile is None:
+            return None
+        profile.disable()
+        if elapsed < self.threshold:
+            return None
+
+        if not os.path.isdir(self.folder):
+            os.makedirs(self.folder, exist_ok=True)
+        safe_name = re.sub(r"[^A-Za-z0-9_.-]+", "_", name).strip("_") or "root"
+        path = os.path.join(self.folder, "%s-%d-%dms.prof" % (safe_name, time.time() * 1000, elapsed * 1000))
+        profile.dump_stats(path)
+        increment("speech_profiles_written_total")
+        return path
+
+
+profiler = SlowCallProfiler(config.profile_sample_rate, config.profile_threshold_seconds, config.profile_folder)
@@ -0,0 +1,70 @@
+"""
+One shot converter that rewrites the old double encoded json transcripts into the compact format, run
+it from the folder holding the transcripts:
+
+    python migrate_transcripts.py [transcript.json ...]
+
+@author Preston Mackert
+"""
+
+# ---------------------------------------------------------------------------------------------------- #
+# imports
+# ---------------------------------------------------------------------------------------------------- #
+
+import json
+import os
+import sys
+import transcript_format
+
+
+# ---------------------------------------------------------------------------------------------------- #
+# support methods
+# ---------------------------------------------------------------------------------------------------- #
+
+def migrate_file(path):
+    """ converts a single transcript in place, returns False when it was not an old style transcript """
+    try:
+        with open(path) as infile:
+            data = json.load(infile)
+    except ValueError:
+        return False
+
+    # only the double encoded transcripts are json strings at the top level
+    if not isinstance(data, str):
+        return False
+    results = json.loads(data).get("results")
+    if results is None:
+        return False
+
+    transcript_format.write_compact(path, results)
+    return True
+
+
+def migrate(paths):
+    """ converts every old style transcript in paths, printing the size change of each """
+    converted = 0
+    for path in paths:
+        old_size = os.path.getsize(path)
+        if migrate_file(path):
+            converted += 1
+            print(path + ": " + str(old_size) + " -> " + str(os.path.getsize(path)) + " bytes")
+        else:
+            print(path + ": skipped")
+    print("converted " + str(converted) + " transcripts")
+
+
+# ---------------------------------------------------------------------------------------------------- #
+# main method
+# ---------------------------------------------------------------------------------------------------- #
+
+def main():
+    paths = sys.argv[1:] or sorted(name for name in os.listdir(os.getcwd()) if name.endswith(".json"))
+    migrate(paths)
+
+
+# ---------------------------------------------------------------------------------------------------- #
+# call main
+# ---------------------------------------------------------------------------------------------------- #
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+"""
+Speech recognizers that get_transcript and send_batch can transcribe with. every recognizer takes the
+same recognize() call as watson's speech to text client and answers with a watson shaped response, so
+transcripts read the same whichever one made them. config.recognizer picks the one used by default:
+
+    watson  IBM Watson speech to text, the original backend
+    local   offline and cpu only, vosk running in a pool of processes (pip install vosk, plus a model)
+    fake    canned transcripts without any audio processing, for tests and benchmarks
+
+fakes of watson's tone analyzer and personality insights clients live here too, so the analysis pages
+can be exercised without the network the same way
+
+@author Preston Mackert
+"""
+
+# ---------------------------------------------------------------------------------------------------- #
+# imports
+# ---------------------------------------------------------------------------------------------------- #
+
+import importlib.util
+import json
+import multiprocessing
+import os
+import threading
+import wave
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+import audio_preprocess
+import config
+from watson_clients import watson_sdk
+
+
+# ---------------------------------------------------------------------------------------------------- #
+# interface
+# ---------------------------------------------------------------------------------------------------- #
+
+class Recognizer(ABC):
+    """ turns audio into a watson shaped response, {"results": [...], "result_index": 0}, where every
+    result is {"alternatives": [{"transcript", "confidence", "word_confidence"}], "final": True} """
+
+    name = None
+
+    # the sample rate the recognizer works at, audio recorded above it is resampled down before it is
+    # sent. None leaves the rate alone
+    sample_rate = None
+
+    @abstractmethod
+    def recognize(self, audio, content_type, timestamps=False, word_confidence=True):
+        """ audio is a file object opened in binary mode or an iterable of byte chunks """
+
+
+def read_audio(audio):
+    """ every byte of a file object or an iterable of byte chunks """
+    if hasattr(audio, "read"):
+        return audio.read()
+    return b"".join(audio)
+
+
+def watson_result(words, confidences):
+    """ one final result in watson's shape from a stretch of words and their confidences """
+    word_confidence = [[word, confidence] for word, confidence in zip(words, confidences)]
+    confidence = sum(confidences) / len(confidences)
+    return {"alternatives": [{"transcript": " ".join(words) + " ", "confidence": confidence,
+                              "word_confidence": word_confidence}], "final": True}
+
+
+# ---------------------------------------------------------------------------------------------------- #
+# watson
+# ---------------------------------------------------------------------------------------------------- #
+
+class WatsonRecognizer(Recognizer):
+    """ IBM Watson speech to text with the credentials stored in config """
+
+    name = "watson"
+    # the default broadband models
+    sample_rate = 16000
+
+    def __init__(self):
+        self.client = watson_sdk().SpeechToTextV1(username=config.stt_uname, password=config.stt_pword,
+                                                  url=config.stt_url)
+
+    def recognize(self, audio, content_type, timestamps=False, word_confidence=True):
+        return self.client.recognize(audio=audio, content_type=content_type, timestamps=timestamps,
+                                     word_confidence=word_confidence)
+
+
+# ---------------------------------------------------------------------------------------------------- #
+# local
+# ---------------------------------------------------------------------------------------------------- #
+
+# each process of the local pool loads the model once and keeps it
+_local_model = None
+
+_local_pool = None
+_local_pool_lock = threading.Lock()
+
+
+def _load_local_model(model_path):
+    global _local_model
+    import vosk
+    vosk.SetLogLevel(-1)
+    _local_model = vosk.Model(model_path)
+
+
+def _recognize_locally(audio_bytes):
+    """ runs in a pool process, decodes a pcm wav file and recognizes it with the process's model """
+    import vosk
+    with wave.open(BytesIO(audio_bytes)) as wav:
+        channels, width, rate = wav.getnchannels(), wav.getsampwidth(), wav.getframerate()
+        frames = wav.readframes(wav.getnframes())
+    if channels > 2:
+        raise ValueError("the local recognizer reads mono or stereo audio, not " + str(channels) +
+                         " channels")
+    frames = audio_preprocess.to_mono_16bit(frames, channels, width)
+
+    recognizer = vosk.KaldiRecognizer(_local_model, rate)
+    recognizer.SetWords(True)
+    segments = []
+    # a second of audio at a time, vosk closes a segment at each pause it hears
+    step = rate * 2
+    for start in range(0, len(frames), step):
+        if recognizer.AcceptWaveform(frames[start:start + step]):
+            segments.append(json.loads(recognizer.Result()))
+    segments.append(json.loads(recognizer.FinalResult()))
+
+    results = []
+    for segment in segments:
+        words = segment.get("result", [])
+        if words:
+            results.append(watson_result([word["word"] for word in words],
+                                         [word["conf"] for word in words]))
+    return {"results": results, "result_index": 0}
+
+
+def local_pool():
+    """ the process pool shared by every local recognizer, started the first time one is built """
+    global _local_pool
+    with _local_pool_lock:
+        if _local_pool is None:
+            processes = config.local_recognizer_processes or os.cpu_count()
+            # spawned, not forked, since the pool is started from one of the batch's threads
+            _local_pool = ProcessPoolExecutor(max_workers=processes,
+                                              mp_context=multiprocessing.get_context("spawn"),
+                                              initializer=_load_local_model,
+                                              initargs=(config.local_model_path,))
+        return _local_pool
+
+
+class LocalRecognizer(Recognizer):
+    """ offline recognition with vosk on the cpu. files are recognized in a pool of processes, one model
+    per process, so a batch with at least as many workers as processes uses every core. only pcm wav
+    audio is accepted """
+
+    name = "local"
+    sample_rate = 16000
+
+    def __init__(self):
+        if importlib.util.find_spec("vosk") is None:
+            raise RuntimeError("the local recognizer needs vosk, pip install vosk")
+        if not os.path.isdir(config.local_model_path):
+            raise RuntimeError("no vosk model at " + config.local_model_path + ", download one from "
+                               "https://alphacephei.com/vosk/models")
+        self.pool = local_pool()
+
+    def recognize(self, audio, content_type, timestamps=False, word_confidence=True):
+        if content_type not in ("audio/wav", "audio/x-wav", "audio/wave"):
+            raise ValueError("the local recognizer only reads wav audio, not " + content_type)
+        return self.pool.submit(_recognize_locally, read_audio(audio)).result()
+
+
+# ---------------------------------------------------------------------------------------------------- #
+# fake
+# ---------------------------------------------------------------------------------------------------- #
+
+class FakeRecognizer(Recognizer):
+    """ answers every call with the same script split into results of words_per_result words, without
+    looking at the audio. the first failures calls raise instead, to exercise retries, and every call's
+    content type is kept in calls """
+
+    name = "fake"
+
+    SCRIPT = ("thank you for calling how can I help you today I have a question about my prescription "
+              "and the side effects I have been having since I started taking it last week")
+
+    def __init__(self, script=None, words_per_result=10, confidence=0.9, failures=0):
+        self.words = (script or self.SCRIPT).split()
+        self.words_per_result = words_per_result
+        self.confidence = confidence
+        self.failures = failures
+        self.calls = []
+
+    def recognize(self, audio, content_type, timestamps=False, word_confidence=True):
+        read_audio(audio)
+        self.calls.append(content_type)
+        if len(self.calls) <= self.failures:
+            raise RuntimeError("fake recognizer failure " + str(len(self.calls)))
+
+        results = []
+        for start in range(0, len(self.words), self.words_per_result):
+            words = self.words[start:start + self.words_per_result]
+            results.append(watson_result(words, [self.confidence] * len(words)))
+        return {"results": results, "result_index": 0}
+
+
+class FakeToneAnalyzer(object):
+    """ answers tone() the way watson's tone analyzer v3 does, with the same document tones for every
+    text. the first failures calls raise instead, and every analyzed text is kept in calls """
+
+    TONES = {"Analytical": 0.82, "Tentative": 0.61}
+
+    def __init__(self, tones=None, failures=0):
+        self.tones = self.TONES if tones is None else tones
+        self.failures = failures
+        self.calls = []
+
+    def tone(self, tone_input, content_type="application/json", sentences=None, tones=None):
+        self.calls.append(tone_input)
+        if len(self.calls) <= self.failures:
+            raise RuntimeError("fake tone analyzer failure " + str(len(self.calls)))
+        return {"document_tone": {"tones": [{"score": score, "tone_id": name.lower(), "tone_name": name}
+                                            for name, score in sorted(self.tones.items())]}}
+
+
+class FakePersonalityInsights(object):
+    """ answers profile() the way watson's personality insights v3 does, with the same fixed profile for
+    every text. the first failures calls raise instead, and every profiled text is kept in calls """
+
+    TRAITS = {"Openness": ("Adventurousness", "Intellect"),
+              "Conscientiousness": ("Orderliness", "Dutifulness"),
+              "Extraversion": ("Cheerfulness", "Gregariousness"), "Agreeableness": ("Altruism", "Trust"),
+              "Emotional range": ("Anxiety", "Vulnerability")}
+    NEEDS = ("Curiosity", "Harmony", "Structure")
+    VALUES = ("Conservation", "Openness to change", "Self-enhancement")
+    PREFERENCES = {"Purchasing Preferences": ("Likely to be sensitive to ownership cost",),
+                   "Health & Activity Preferences": ("Likely to be concerned about the environment",)}
+
+    def __init__(self, percentile=0.5, failures=0):
+        self.percentile = percentile
+        self.failures = failures
+        self.calls = []
+
+    def trait(self, name, children=None):
+        trait = {"trait_id": name.lower(), "name": name, "percentile": self.percentile}
+        if children is not None:
+            trait["children"] = [self.trait(child) for child in children]
+        return trait
+
+    def profile(self, content, content_type=None, raw_scores=False, consumption_preferences=False, **kwargs):
+        self.calls.append(content)
+        if len(self.calls) <= self.failures:
+            raise RuntimeError("fake personality insights failure " + str(len(self.calls)))
+        profile = {"word_count": len(content.split()), "processed_language": "en",
+                   "personality": [self.trait(name, children)
+                                   for name, children in sorted(self.TRAITS.items())],
+                   "needs": [self.trait(name) for name in self.NEEDS],
+                   "values": [self.trait(name) for name in self.VALUES]}
+        if consumption_preferences:
+            profile["consumption_preferences"] = [
+                {"name": name, "consumption_preferences": [{"name": preference, "score": 1.0}
+                                                           for preference in preferences]}
+                for name, preferences in sorted(self.PREFERENCES.items())]
+        return profile
+
+
+# ---------------------------------------------------------------------------------------------------- #
+# choosing a recognizer
+# ---------------------------------------------------------------------------------------------------- #
+
+RECOGNIZERS = {
+    "watson": WatsonRecognizer,
+    "local": LocalRecognizer,
+    "fake": FakeRecognizer,
+}
+
+
+def new_recognizer(name=None):
+    """ a new recognizer of the named kind, config.recognizer by default """
+    name = name or config.recognizer
+    if name not in RECOGNIZERS:
+        raise ValueError("unknown recognizer " + repr(name) + ", expected one of " +
+                         ", ".join(sorted(RECOGNIZERS)))
+    return RECOGNIZERS[name]()
@@ -0,0 +1,110 @@
+"""
+Keeps the vader line scores of every text file on disk between runs, so a folder only needs the files
+that are new or changed since the last scan to be scored again. entries are matched on mtime and size
+first, and on a hash of the contents when those have changed
+
+@author Preston Mackert
+"""
+
+# ---------------------------------------------------------------------------------------------------- #
+# imports
+# ---------------------------------------------------------------------------------------------------- #
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+
+# ---------------------------------------------------------------------------------------------------- #
+# support methods
+# ---------------------------------------------------------------------------------------------------- #
+
+def file_signature(path):
+    stat = os.stat(path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def file_digest(path):
+    with open(path, "rb") as infile:
+        return hashlib.sha1(infile.read()).hexdigest()
+
+
+# ---------------------------------------------------------------------------------------------------- #
+# score store
+# ---------------------------------------------------------------------------------------------------- #
+
+class ScoreStore(object):
+    """ line scores keyed by absolute file path, stored as one json document that is read once when the
+    store is first used and rewritten whole after each scan that changed something """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = None
+        self.dirty = False
+        self.lock = threading.Lock()
+
+    def load(self):
+        if self.entries is None:
+            try:
+                with open(self.path) as infile:
+                    self.entries = json.load(infile)
+            except (OSError, ValueError):
+                self.entries = {}
+        return self.entries
+
+    def lookup(self, path):
+        """ the stored line scores for a file, or None if it is new or its contents changed """
+        key = os.path.abspath(path)
+        with self.lock:
+            entry = self.load().get(key)
+        if entry is None:
+            return None
+
+        signature = file_signature(path)
+        if entry["signature"] == signature:
+            return entry["scores"]
+
+        # touched but not edited, the old scores still hold
+        if entry["digest"] == file_digest(path):
+            with self.lock:
+                entry["signature"] = signature
+                self.dirty = True
+            return entry["scores"]
+        return None
+
+    def update(self, path, scores):
+        entry = {"signature": file_signature(path), "digest": file_digest(path), "scores": scores}
+        with self.lock:
+            self.load()[os.path.abspath(path)] = entry
+            self.dirty = True
+
+    def prune(self, folder_name, present_paths):
+        """ drops the entries of files in folder_name that no longer exist """
+        folder = os.path.abspath(folder_name)
+        present = set(os.path.abspath(path) for path in present_paths)
+        with self.lock:
+            entries = self.load()
+            for key in list(entries):
+                if os.path.dirname(key) == folder and key not in present:
+                    del entries[key]
+                    self.dirty = True
+
+    def save(self):
+        """ writes the store back out if anything changed, replacing the old file atomically """
+        with self.lock:
+            if not self.dirty:
+                return
+            # a temp file of its own, every server process saves the same store
+            handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)),
+                                                 prefix=os.path.basename(self.path), suffix=".tmp")
+            try:
+                with os.fdopen(handle, "w") as outfile:
+                    json.dump(self.entries, outfile, separators=(",", ":"))
+                os.chmod(temp_path, 0o644)
+                os.replace(temp_path, self.path)
+            except BaseException:
+                os.remove(temp_path)
+                raise
+            self.dirty = False
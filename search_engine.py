@@ -0,0 +1,302 @@
+"""
+One search over every text corpus and every catalogued transcript. text is split into unicode aware,
+accent and case insensitive tokens, each token keeps the positions it occurs at, and a query is ranked
+with BM25 in a single walk over the postings of the terms it matches. terms match a query word exactly,
+by prefix, or fuzzily, and every result carries where its matches are so a page can jump to them
+
+@author Preston Mackert
+"""
+
+# ---------------------------------------------------------------------------------------------------- #
+# imports
+# ---------------------------------------------------------------------------------------------------- #
+
+import bisect
+import heapq
+import math
+import os
+import re
+import threading
+import time
+import unicodedata
+from array import array
+from collections import Counter
+import config
+import helper_functions as helper
+import metrics
+import transcript_catalog as catalog
+
+
+# ---------------------------------------------------------------------------------------------------- #
+# tokenizing
+# ---------------------------------------------------------------------------------------------------- #
+
+# chinese and japanese are written without spaces, so each of their characters is a token of its own.
+# any other run of letters and digits is a token, apostrophes inside a word (don't, l'homme) included
+CJK = "぀-ヿ㐀-䶿一-鿿豈-﫿"
+TOKEN = re.compile("[" + CJK + "]|[^\\W_" + CJK + "]+(?:['’][^\\W_" + CJK + "]+)*")
+
+
+def normalize(token):
+    """ case folded with accents removed, so Café, CAFE and cafe are the same term """
+    decomposed = unicodedata.normalize("NFKD", token.casefold())
+    return "".join(character for character in decomposed if not unicodedata.combining(character)).replace(
+        "’", "'")
+
+
+def tokenize(text):
+    return [normalize(match.group()) for match in TOKEN.finditer(text)]
+
+
+# ---------------------------------------------------------------------------------------------------- #
+# documents
+# ---------------------------------------------------------------------------------------------------- #
+
+class Document(object):
+    """ an indexed text file or transcript. positions are token numbers, starts holds the position each
+    line or chunk begins at so a position can be turned back into something a page can show, and for
+    transcripts words holds the word number of each position """
+
+    def __init__(self, key, kind, name, corpus, signature):
+        self.key = key
+        self.kind = kind
+        self.name = name
+        self.corpus = corpus
+        self.signature = signature
+        self.length = 0
+        self.terms = {}
+        self.starts = array("I")
+        self.words = array("I")
+
+    def add(self, term, position):
+        positions = self.terms.get(term)
+        if positions is None:
+            positions = self.terms[term] = array("I")
+        positions.append(position)
+        self.length += 1
+
+    def locate(self, position):
+        """ the line (text files) or chunk (transcripts) a match is in, counted from 0 """
+        section = max(bisect.bisect_right(self.starts, position) - 1, 0)
+        if self.kind == "text":
+            return {"line": section, "word": position - self.starts[section] if self.starts else 0}
+        return {"chunk": section, "word": self.words[position]}
+
+
+def read_text_document(key, corpus, path, signature):
+    document = Document(key, "text", os.path.basename(path), corpus, signature)
+    position = 0
+    with open(path, encoding="utf-8", errors="replace") as infile:
+        for line in infile:
+            document.starts.append(position)
+            for term in tokenize(line):
+                document.add(term, position)
+                position += 1
+    return document
+
+
+def read_transcript_document(key, path, signature):
+    document = Document(key, "transcript", path, None, signature)
+    data = helper.convert_json_to_data(path)
+    words = data["words"]
+    # every token gets a position of its own, so chunks without word confidences, which all start at the
+    # same word, still begin at different positions and a match is found in the chunk it came from
+    for chunk in data["chunks"]:
+        document.starts.append(document.length)
+        if chunk["end"] > chunk["start"]:
+            for index in range(chunk["start"], chunk["end"]):
+                word = words.word(index)
+                # watson marks hesitations as %HESITATION, they aren't words anybody searches for
+                if not word.startswith("%"):
+                    for term in tokenize(word):
+                        document.add(term, document.length)
+                        document.words.append(index)
+        else:
+            # a chunk without word confidences still gets its words, all placed at the chunk's start
+            for term in tokenize(chunk["transcript"]):
+                document.add(term, document.length)
+                document.words.append(chunk["start"])
+    return document
+
+
+# what reading a missing file, or a json file that isn't a transcript, can raise
+UNREADABLE = (OSError,) + helper.NOT_A_TRANSCRIPT
+
+
+def file_signature(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+# ---------------------------------------------------------------------------------------------------- #
+# search engine
+# ---------------------------------------------------------------------------------------------------- #
+
+MODES = ("exact", "prefix", "fuzzy")
+
+# the usual BM25 constants, k1 is how quickly repeats of a term stop adding to a score and b how much a
+# long document is marked down
+K1 = 1.2
+B = 0.75
+
+
+class SearchEngine(object):
+    """ inverted index over documents, kept up to date by refresh(). a document is only read again once
+    its file changes, and removed once its file or catalog entry is gone """
+
+    def __init__(self):
+        self.documents = {}
+        self.postings = {}
+        self.terms_by_length = {}
+        self.sorted_terms = None
+        self.total_length = 0
+        self.refreshed = None
+        self.lock = threading.RLock()
+
+    # ------------------------------------------------------------------------------------------------ #
+
+    def add(self, document):
+        self.remove(document.key)
+        self.documents[document.key] = document
+        self.total_length += document.length
+        for term, positions in document.terms.items():
+            postings = self.postings.get(term)
+            if postings is None:
+                postings = self.postings[term] = {}
+                self.terms_by_length.setdefault(len(term), set()).add(term)
+                self.sorted_terms = None
+            postings[document.key] = positions
+
+    def remove(self, key):
+        document = self.documents.pop(key, None)
+        if document is None:
+            return
+        self.total_length -= document.length
+        for term in document.terms:
+            postings = self.postings[term]
+            del postings[key]
+            if not postings:
+                del self.postings[term]
+                self.terms_by_length[len(term)].discard(term)
+                self.sorted_terms = None
+
+    def sources(self):
+        """ (key, reader, path) for every document that should be in the index, reader builds its Document """
+        for corpus, folder_name in sorted(config.text_corpora.items()):
+            if not os.path.isdir(folder_name):
+                continue
+            for file in sorted(os.listdir(folder_name)):
+                path = os.path.join(folder_name, file)
+                if os.path.isfile(path):
+                    yield ("text", corpus, file), lambda key, signature, corpus=corpus, path=path: \
+                        read_text_document(key, corpus, path, signature), path
+        for entry in catalog.iter_transcripts():
+            path = entry["path"]
+            yield ("transcript", path), lambda key, signature, path=path: \
+                read_transcript_document(key, path, signature), path
+
+    @metrics.timed("search_index_refresh")
+    def refresh(self, force=False):
+        """ brings the index in line with the files on disk, at most once every
+        config.search_refresh_seconds unless forced """
+        with self.lock:
+            if not force and self.refreshed is not None and \
+                    time.monotonic() - self.refreshed < config.search_refresh_seconds:
+                return
+            present = set()
+            for key, reader, path in self.sources():
+                try:
+                    signature = file_signature(path)
+                    present.add(key)
+                    document = self.documents.get(key)
+                    if document is None or document.signature != signature:
+                        self.add(reader(key, signature))
+                except UNREADABLE:
+                    continue
+            for key in [key for key in self.documents if key not in present]:
+                self.remove(key)
+            self.refreshed = time.monotonic()
+
+    # ------------------------------------------------------------------------------------------------ #
+
+    def expand(self, token, mode):
+        """ the indexed terms a query token matches, each with how strongly it matches from 0 to 1 """
+        if mode == "exact":
+            if token in self.postings:
+                yield token, 1.0
+        elif mode == "prefix":
+            if self.sorted_terms is None:
+                self.sorted_terms = sorted(self.postings)
+            start = bisect.bisect_left(self.sorted_terms, token)
+            for term in self.sorted_terms[start:]:
+                if not term.startswith(token):
+                    break
+                yield term, float(len(token)) / len(term)
+        else:
+            for term, ratio in self.fuzzy_matches(token):
+                yield term, ratio / 100.0
+
+    def fuzzy_matches(self, token):
+        """ (term, fuzz.ratio) for every term at or above the fuzzy threshold. fuzz.ratio is 2 * matches /
+        total length, and matches can be no more than the shorter term or the characters both share, so
+        most terms are ruled out without being scored """
+        from fuzzywuzzy import fuzz
+        threshold = config.search_fuzzy_threshold - 0.5
+        length = len(token)
+        token_chars = Counter(token)
+        for term_length, terms in self.terms_by_length.items():
+            total = length + term_length
+            if 200 * min(length, term_length) < threshold * total:
+                continue
+            for term in terms:
+                if 200 * sum((token_chars & Counter(term)).values()) >= threshold * total:
+                    ratio = fuzz.ratio(token, term)
+                    if ratio >= config.search_fuzzy_threshold:
+                        yield term, ratio
+
+    def search(self, query, mode="exact", kind=None):
+        """ the documents matching query, best first, as a generator of results taken off a heap so a page
+        of them only costs as much sorting as that page. each result has the document's kind ("text" or
+        "transcript"), name, corpus, BM25 score, number of matches, and where the first matches are """
+        if mode not in MODES:
+            raise ValueError("unknown search mode " + repr(mode) + ", expected one of " + ", ".join(MODES))
+        self.refresh()
+
+        with self.lock, metrics.span("search", mode=mode):
+            count = len(self.documents)
+            average_length = float(self.total_length) / count if count else 0.0
+            scores = {}
+            found = {}
+            # one walk over the postings of every matched term scores each document and gathers its matches
+            for token in set(tokenize(query)):
+                for term, strength in list(self.expand(token, mode)):
+                    postings = self.postings[term]
+                    idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                    for key, positions in postings.items():
+                        document = self.documents[key]
+                        if kind is not None and document.kind != kind:
+                            continue
+                        frequency = len(positions)
+                        norm = K1 * (1 - B + B * document.length / average_length)
+                        scores[key] = scores.get(key, 0.0) + strength * idf * frequency * (K1 + 1) / (
+                            frequency + norm)
+                        found.setdefault(key, []).append(positions)
+
+            heap = [(-score, key) for key, score in scores.items()]
+            heapq.heapify(heap)
+            documents = dict((key, self.documents[key]) for key in scores)
+
+        while heap:
+            negative_score, key = heapq.heappop(heap)
+            document = documents[key]
+            positions = sorted(set(position for positions in found[key] for position in positions))
+            matches = [document.locate(position) for position in positions[:config.search_match_positions]]
+            yield {"kind": document.kind, "name": document.name, "corpus": document.corpus,
+                   "score": round(-negative_score, 4), "count": len(positions), "matches": matches}
+
+
+engine = SearchEngine()
+
+
+def search(query, mode="exact", kind=None):
+    return engine.search(query, mode, kind)
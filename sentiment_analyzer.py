@@ -9,85 +9,212 @@ the sake of a proof of concept currently using negative movie reviews as the bas
 # imports
 # ---------------------------------------------------------------------------------------------------- #
 
-from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
-from wtforms import Form, StringField, SelectField
-from fuzzywuzzy import fuzz
+import multiprocessing
+import heapq
 import os
-import operator
+import threading
+import config
+import metrics
+from score_store import ScoreStore
+from sentiment_summary import SentimentSummary
 
 # ---------------------------------------------------------------------------------------------------- #
-# global variables for the sentiment analyzer by vader, and also storing all of the text from files
-# so that we can analyze it and access it without passing through browser
+# global variables for the sentiment analyzer by vader, and the scores of every text folder so pages
+# can reuse them without passing them through the browser
 # ---------------------------------------------------------------------------------------------------- #
 
-analyzer = SentimentIntensityAnalyzer()
-text_db = {}
+# vader's analyzer loads its lexicon when built, so it is only built the first time a line is scored,
+# see get_analyzer
+analyzer = None
+analyzer_lock = threading.Lock()
+
+# the latest scores of each folder, so pages can ask for a folder's scores instead of being handed them
+corpus_scores = {}
+
+# running totals of each folder's scores, built as its files are scored, for pages that only need the
+# overall numbers
+corpus_summaries = {}
+
+# line scores saved between runs so unchanged files never go through vader twice
+score_store = ScoreStore(config.score_store_path)
 
 
 # ---------------------------------------------------------------------------------------------------- #
 # support methods
 # ---------------------------------------------------------------------------------------------------- #
 
+def get_analyzer():
+    """ the shared vader analyzer, imported and built on first use. a server that forks its workers
+    can call this before forking so every worker shares the one lexicon """
+    global analyzer
+    if analyzer is None:
+        with analyzer_lock:
+            if analyzer is None:
+                from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+                analyzer = SentimentIntensityAnalyzer()
+    return analyzer
+
+
+def warm_up():
+    """ loads vader and the fuzzy matching library ahead of the first request that needs them """
+    from fuzzywuzzy import fuzz
+    get_analyzer()
+
+
 def sentiment_analyzer_scores(sentence):
-    score = analyzer.polarity_scores(sentence)
+    score = get_analyzer().polarity_scores(sentence)
     return score
 
 
-def read_and_score_text_files(folder_name):
-    folder = os.listdir(folder_name)
-    scores = {}
-    for file in folder:
-        try:
-            review = open(folder_name+file).readlines()
-            text_db.update({file: review})
-            for line in review:
-                    score = sentiment_analyzer_scores(line)
-                    score = score["compound"]
-                    if score in scores.keys():
-                        scores[score].append(file)
-                    else:
-                        scores[score] = [file]
-        except:
+def score_file(path):
+    """ reads a file and returns the score of each of its lines, or None for files that can't be read.
+    this is the unit of work handed to the scoring processes """
+    try:
+        review = open(path).readlines()
+        return [sentiment_analyzer_scores(line)["compound"] for line in review]
+    except:
+        return None
+
+
+def score_paths(paths, workers, chunk_files):
+    """ score_file over a list of paths, in order. large lists are spread over a pool of processes,
+    each taking chunk_files files at a time """
+    # a pool costs more to start than a small folder takes to score
+    if workers == 1 or len(paths) < 2 * chunk_files:
+        for path in paths:
+            yield score_file(path)
+        return
+
+    # spawned rather than forked, by now the server is running request, batch and job threads, and a fork
+    # taken while one of them holds a lock leaves the child waiting on it forever
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(min(workers, len(paths) // chunk_files)) as pool:
+        for result in pool.imap(score_file, paths, chunk_files):
+            yield result
+
+
+def score_stream(folder_name, workers=None, chunk_files=None, store=None):
+    """ yields (file, line scores) for every readable file in a folder in directory order, as soon as
+    each one is scored. with a score store only new or changed files are scored, the rest come straight
+    from the store without the file being read again, and the store is saved once the folder is done """
+    workers = workers or config.score_workers or os.cpu_count()
+    chunk_files = chunk_files or config.score_chunk_files
+    files = os.listdir(folder_name)
+    paths = [os.path.join(folder_name, file) for file in files]
+
+    stored = {}
+    if store is not None:
+        for path in paths:
+            try:
+                line_scores = store.lookup(path)
+            except OSError:
+                continue
+            if line_scores is not None:
+                stored[path] = line_scores
+    to_score = [path for path in paths if path not in stored]
+    metrics.increment("speech_text_files_total", len(stored), source="score_store")
+    metrics.increment("speech_text_files_total", len(to_score), source="vader")
+    scored = score_paths(to_score, workers, chunk_files)
+
+    for file, path in zip(files, paths):
+        if path in stored:
+            yield file, stored[path]
             continue
+
+        line_scores = next(scored)
+        if line_scores is None:
+            continue
+        if store is not None:
+            store.update(path, line_scores)
+        yield file, line_scores
+
+    if store is not None:
+        store.prune(folder_name, paths)
+        store.save()
+
+
+def read_and_score_text_files(folder_name, workers=None, use_store=True):
+    """ scores every line of every file in the folder, returning the files keyed by line score, and
+    leaves a summary of the scores in corpus_summaries. scores are kept in the score store between runs
+    unless use_store is False """
+    scores = {}
+    summary = SentimentSummary()
+    store = score_store if use_store else None
+    with metrics.span("vader_score"):
+        for file, line_scores in score_stream(folder_name, workers, store=store):
+            summary.add(line_scores)
+            for score in line_scores:
+                if score in scores.keys():
+                    scores[score].append(file)
+                else:
+                    scores[score] = [file]
+    corpus_summaries[folder_name] = summary
     return scores
 
 
-def get_20_most_neg_files(scored_files):
-    inorder = sorted(scored_files)
-    files = {}
-    count = 0
-    pos = 0
-    while count < 20:
-        score = inorder[pos]
-        for file in scored_files[score]:
-            files[file] = score
-            count += 1
-        pos += 1
-    return files
-
-
-def search_files(keyphrase):
-    table_data = {}
-    for file in text_db:
-        text = text_db[file]
-        for line in text:
-            for word in line.split(" "):
-                if fuzz.ratio(keyphrase, word) >= 75:
-                    if file in table_data.keys():
-                        table_data[file].append(fuzz.ratio(keyphrase, word))
-                    else:
-                        table_data[file] = [fuzz.ratio(keyphrase, word)]
-    return table_data
-
-
-def sort_search(data):
+def score_corpus(folder_name):
+    """ scores a folder and keeps the result around for get_corpus_scores """
+    scores = read_and_score_text_files(folder_name)
+    corpus_scores[folder_name] = scores
+    return scores
+
+
+def get_corpus_scores(folder_name):
+    """ the stored scores for a folder, scoring it first if nothing has been stored yet """
+    scores = corpus_scores.get(folder_name)
+    if scores is None:
+        scores = score_corpus(folder_name)
+    return scores
+
+
+def get_corpus_summary(folder_name):
+    """ the SentimentSummary of a folder's latest scores, scoring it first if it hasn't been yet """
+    summary = corpus_summaries.get(folder_name)
+    if summary is None:
+        score_corpus(folder_name)
+        summary = corpus_summaries[folder_name]
+    return summary
+
+
+def scores_by_file(scored_files):
+    """ turns the files keyed by line score back into each file's list of line scores """
     file_scores = {}
-    for file in data:
-        num_files = len(data[file])
-        avg_score = sum(data[file])/num_files
-        composite = num_files+avg_score
-        file_scores.update({file: composite})
-    return sorted(file_scores.items(), key=operator.itemgetter(1), reverse=True)
+    for score in scored_files:
+        for file in scored_files[score]:
+            file_scores.setdefault(file, []).append(score)
+    return file_scores
+
+
+# ways of boiling a file's line scores down to one number, "worst" means the line furthest in the
+# direction being ranked, so the most negative line when looking for negative files
+AGGREGATES = {
+    "min": min,
+    "max": max,
+    "mean": lambda line_scores: sum(line_scores) / len(line_scores),
+}
+
+
+def top_k_files(file_scores, k=20, most="negative", aggregate="worst"):
+    """ the k most negative (or most positive) files as a list of (file, score) pairs, best first. each
+    file is scored once with the chosen aggregate of its line scores, and a heap of size k keeps this
+    O(n log k) in the number of files. ties are broken by file name """
+    if most not in ("negative", "positive"):
+        raise ValueError("most must be 'negative' or 'positive', not " + repr(most))
+    if aggregate == "worst":
+        aggregate = "min" if most == "negative" else "max"
+    if aggregate not in AGGREGATES:
+        raise ValueError("unknown aggregate " + repr(aggregate))
+
+    # flipping the sign lets both directions share one smallest-k heap
+    combine = AGGREGATES[aggregate]
+    sign = 1 if most == "negative" else -1
+    ranked = ((sign * combine(line_scores), file) for file, line_scores in file_scores.items() if line_scores)
+    return [(file, sign * score) for score, file in heapq.nsmallest(k, ranked)]
+
+
+def get_20_most_neg_files(scored_files):
+    """ the 20 files with the most negative line, most negative first """
+    return dict(top_k_files(scores_by_file(scored_files), 20))
 
 # ---------------------------------------------------------------------------------------------------- #
 # main method
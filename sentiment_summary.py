@@ -0,0 +1,108 @@
+"""
+Running summary of a text folder's vader scores. counts, sums and a fine fixed-bin histogram are added
+to as each file is scored, so the numbers the graph page shows (mean, median, positive and negative
+lines, the distribution) are read from a summary whose size doesn't depend on how many files there are
+
+@author Preston Mackert
+"""
+
+# ---------------------------------------------------------------------------------------------------- #
+# imports
+# ---------------------------------------------------------------------------------------------------- #
+
+from array import array
+
+
+# ---------------------------------------------------------------------------------------------------- #
+# summary
+# ---------------------------------------------------------------------------------------------------- #
+
+# vader compound scores fall in [-1, 1], the fine bins are 0.001 wide so quantiles are off by at most
+# half of that
+LOW = -1.0
+HIGH = 1.0
+FINE_BINS = 2000
+
+
+class SentimentSummary(object):
+    """ counts, sum, extremes and a histogram of line scores. two summaries merge into the summary of
+    both sets of files, so a summary can be built up piece by piece in any order """
+
+    def __init__(self):
+        self.files = 0
+        self.count = 0
+        self.total = 0.0
+        self.positive = 0
+        self.negative = 0
+        self.low = None
+        self.high = None
+        self.bins = array("l", [0]) * FINE_BINS
+
+    def add(self, line_scores):
+        """ adds one file's line scores. a score of 0 counts as positive, as the graph page always has """
+        self.files += 1
+        bins = self.bins
+        for score in line_scores:
+            bins[fine_bin(score)] += 1
+            self.total += score
+            if score >= 0:
+                self.positive += 1
+            else:
+                self.negative += 1
+        if line_scores:
+            self.count += len(line_scores)
+            low, high = min(line_scores), max(line_scores)
+            self.low = low if self.low is None else min(self.low, low)
+            self.high = high if self.high is None else max(self.high, high)
+
+    def merge(self, other):
+        self.files += other.files
+        self.count += other.count
+        self.total += other.total
+        self.positive += other.positive
+        self.negative += other.negative
+        for low in (self.low, other.low):
+            if low is not None and (self.low is None or low < self.low):
+                self.low = low
+        for high in (self.high, other.high):
+            if high is not None and (self.high is None or high > self.high):
+                self.high = high
+        for index, count in enumerate(other.bins):
+            if count:
+                self.bins[index] += count
+        return self
+
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def quantile(self, q):
+        """ the score q of the way through the sorted line scores, to within one fine bin """
+        if not self.count:
+            return None
+        target = q * (self.count - 1)
+        seen = 0
+        width = (HIGH - LOW) / FINE_BINS
+        for index, count in enumerate(self.bins):
+            seen += count
+            if seen > target:
+                middle = LOW + (index + 0.5) * width
+                return min(max(middle, self.low), self.high)
+        return self.high
+
+    def median(self):
+        return self.quantile(0.5)
+
+    def histogram(self, bins=20):
+        """ the line counts in bins equal width buckets over [-1, 1] as (low, high, count) tuples, made by
+        adding up the fine bins, bins has to divide FINE_BINS """
+        if FINE_BINS % bins:
+            raise ValueError("bins must divide " + str(FINE_BINS) + ", not " + repr(bins))
+        step = FINE_BINS // bins
+        width = (HIGH - LOW) / bins
+        return [(round(LOW + bucket * width, 6), round(LOW + (bucket + 1) * width, 6),
+                 sum(self.bins[bucket * step:(bucket + 1) * step])) for bucket in range(bins)]
+
+
+def fine_bin(score):
+    index = int((score - LOW) * FINE_BINS / (HIGH - LOW))
+    return min(max(index, 0), FINE_BINS - 1)
@@ -0,0 +1,239 @@
+"""
+Tests for the watson client plumbing (client pool, token bucket, result cache, the cached tone and
+personality calls), send_batch's retries and the lease on background transcription jobs. nothing here
+reaches watson, every client is one of the fakes in recognizers.py
+
+    python -m pytest tests
+
+@author Preston Mackert
+"""
+
+# ---------------------------------------------------------------------------------------------------- #
+# imports
+# ---------------------------------------------------------------------------------------------------- #
+
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+import helper_functions as helper
+import recognizers
+import transcription_jobs as jobs
+from watson_clients import ClientPool, ResultCache, TokenBucket
+
+
+# ---------------------------------------------------------------------------------------------------- #
+# fixtures
+# ---------------------------------------------------------------------------------------------------- #
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """ a scratch working directory with its own catalog, job queue and analysis cache """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(config, "catalog_path", str(tmp_path / "transcripts.db"))
+    monkeypatch.setattr(config, "jobs_path", str(tmp_path / "jobs.db"))
+    monkeypatch.setattr(config, "preprocess_audio", False)
+    monkeypatch.setattr(config, "stream_transcripts", False)
+    monkeypatch.setattr(helper, "analysis_cache", ResultCache(str(tmp_path / "analysis_cache.db")))
+    monkeypatch.setattr(helper, "watson_rate_limit", TokenBucket(1000, 1000))
+    return tmp_path
+
+
+@pytest.fixture
+def audio_folder(workdir):
+    """ a folder of wav files, the fake recognizer never looks inside them """
+    folder = workdir / "audio"
+    folder.mkdir()
+    for name in ("a.wav", "b.wav", "c.wav"):
+        (folder / name).write_bytes(b"RIFF")
+    return "audio"
+
+
+# ---------------------------------------------------------------------------------------------------- #
+# client pool
+# ---------------------------------------------------------------------------------------------------- #
+
+def test_client_pool_reuses_clients():
+    built = []
+    pool = ClientPool(lambda: built.append(object()) or built[-1], 2)
+    with pool.client() as first:
+        pass
+    with pool.client() as second:
+        pass
+    assert first is second
+    assert len(built) == 1
+
+
+def test_client_pool_builds_no_more_than_size():
+    pool = ClientPool(object, 1)
+    first = pool.checkout()
+    taken = []
+    waiter = threading.Thread(target=lambda: taken.append(pool.checkout()))
+    waiter.start()
+    waiter.join(0.1)
+    # the second caller waits for the only client instead of building another
+    assert waiter.is_alive()
+    pool.idle.put(first)
+    waiter.join(1)
+    assert taken == [first]
+    assert pool.created == 1
+
+
+def test_client_pool_factory_failure_frees_its_slot():
+    attempts = []
+
+    def factory():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("no credentials")
+        return object()
+
+    pool = ClientPool(factory, 1)
+    with pytest.raises(RuntimeError):
+        pool.checkout()
+    assert pool.checkout() is not None
+    assert pool.created == 1
+
+
+# ---------------------------------------------------------------------------------------------------- #
+# token bucket
+# ---------------------------------------------------------------------------------------------------- #
+
+def test_token_bucket_allows_a_burst_then_waits():
+    bucket = TokenBucket(20, 3)
+    start = time.monotonic()
+    for _ in range(3):
+        bucket.acquire()
+    assert time.monotonic() - start < 0.04
+    bucket.acquire()
+    assert time.monotonic() - start >= 0.04
+
+
+# ---------------------------------------------------------------------------------------------------- #
+# result cache and cached analysis
+# ---------------------------------------------------------------------------------------------------- #
+
+def test_result_cache_persists_across_instances(tmp_path):
+    path = str(tmp_path / "cache.db")
+    key = ResultCache.key("tone", "some text")
+    cache = ResultCache(path)
+    assert cache.get(key) is None
+    cache.put(key, {"Joy": 0.5})
+    assert ResultCache(path).get(key) == {"Joy": 0.5}
+    assert (cache.hits, cache.misses) == (0, 1)
+    assert ResultCache.key("tone", "other text") != key
+    assert ResultCache.key("personality", "some text") != key
+
+
+def test_analyze_tone_is_only_sent_once(workdir, monkeypatch):
+    analyzer = recognizers.FakeToneAnalyzer({"Joy": 0.7})
+    monkeypatch.setattr(helper, "tone_clients", ClientPool(lambda: analyzer, 1))
+    assert helper.analyze_tone("thank you so much") == {"Joy": 0.7}
+    assert helper.analyze_tone("thank you so much") == {"Joy": 0.7}
+    assert analyzer.calls == ["thank you so much"]
+
+
+def test_failed_analysis_is_not_cached(workdir, monkeypatch):
+    analyzer = recognizers.FakeToneAnalyzer(failures=1)
+    monkeypatch.setattr(helper, "tone_clients", ClientPool(lambda: analyzer, 1))
+    with pytest.raises(RuntimeError):
+        helper.analyze_tone("hello")
+    assert helper.analyze_tone("hello") == recognizers.FakeToneAnalyzer.TONES
+    assert len(analyzer.calls) == 2
+
+
+def test_analyze_personality_is_only_sent_once(workdir, monkeypatch):
+    insights = recognizers.FakePersonalityInsights(percentile=0.25)
+    monkeypatch.setattr(helper, "personality_clients", ClientPool(lambda: insights, 1))
+    profile = helper.analyze_personality("word " * 100)
+    assert profile["personality"]["Openness"] == [0.25, {"Adventurousness": 0.25, "Intellect": 0.25}]
+    assert profile["needs"]["Harmony"] == 0.25
+    assert helper.analyze_personality("word " * 100) == profile
+    assert len(insights.calls) == 1
+
+
+# ---------------------------------------------------------------------------------------------------- #
+# batch retries
+# ---------------------------------------------------------------------------------------------------- #
+
+def test_send_batch_retries_until_a_file_goes_through(audio_folder):
+    recognizer = recognizers.FakeRecognizer(failures=2)
+    summary = helper.send_batch(audio_folder, workers=1, retries=2, backoff=0, files=["a.wav"],
+                                client_factory=lambda: recognizer)
+    assert summary["succeeded"] == ["a.wav"]
+    assert summary["failed"] == {}
+    assert len(recognizer.calls) == 3
+    assert helper.convert_json_to_data("a.json")["words"]
+
+
+def test_send_batch_gives_up_after_its_retries(audio_folder):
+    recognizer = recognizers.FakeRecognizer(failures=3)
+    summary = helper.send_batch(audio_folder, workers=1, retries=2, backoff=0, files=["a.wav"],
+                                client_factory=lambda: recognizer)
+    assert summary["succeeded"] == []
+    assert summary["failed"] == {"a.wav": "fake recognizer failure 3"}
+    assert not os.path.exists("a.json")
+
+
+def test_send_batch_fails_every_file_when_no_client_can_be_built(audio_folder):
+    def broken():
+        raise RuntimeError("no model")
+
+    summary = helper.send_batch(audio_folder, workers=2, retries=0, backoff=0, client_factory=broken)
+    assert summary["succeeded"] == []
+    assert summary["failed"] == {"a.wav": "no model", "b.wav": "no model", "c.wav": "no model"}
+
+
+# ---------------------------------------------------------------------------------------------------- #
+# job lease
+# ---------------------------------------------------------------------------------------------------- #
+
+def test_a_claimed_job_is_not_claimed_twice(audio_folder):
+    job_id = jobs.enqueue(audio_folder)
+    assert jobs.claim_job() == (job_id, audio_folder)
+    assert jobs.claim_job() is None
+
+
+def test_an_expired_lease_puts_in_flight_files_back_in_line(audio_folder, monkeypatch):
+    job_id = jobs.enqueue(audio_folder)
+    jobs.claim_job()
+    jobs.set_file_status(job_id, "a.wav", "done")
+    jobs.set_file_status(job_id, "b.wav", "running")
+    # the worker holding the job stopped sending heartbeats
+    monkeypatch.setattr(config, "job_lease_seconds", -1)
+    assert jobs.claim_job() == (job_id, audio_folder)
+    status = jobs.job_status(job_id)
+    assert (status["done"], status["in_flight"], status["queued"]) == (1, 0, 2)
+
+
+def test_run_job_transcribes_the_queued_files(audio_folder, monkeypatch):
+    monkeypatch.setattr(config, "recognizer", "fake")
+    job_id = jobs.enqueue(audio_folder)
+    jobs.set_file_status(job_id, "a.wav", "done")
+    jobs.run_job(*jobs.claim_job())
+    status = jobs.job_status(job_id)
+    assert (status["status"], status["done"], status["failed"]) == ("finished", 3, 0)
+    assert not os.path.exists("a.json")
+    assert os.path.exists("b.json") and os.path.exists("c.json")
+
+
+def test_a_job_whose_batch_raises_fails_for_good(audio_folder, monkeypatch):
+    def broken_batch(folder, **kwargs):
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(helper, "send_batch", broken_batch)
+    job_id = jobs.enqueue(audio_folder)
+    jobs.set_file_status(job_id, "a.wav", "done")
+    with pytest.raises(RuntimeError):
+        jobs.run_job(*jobs.claim_job())
+    status = jobs.job_status(job_id)
+    assert (status["status"], status["done"], status["failed"]) == ("failed", 1, 2)
+    assert status["errors"] == {"b.wav": "disk full", "c.wav": "disk full"}
+    monkeypatch.setattr(config, "job_lease_seconds", -1)
+    assert jobs.claim_job() is None
@@ -0,0 +1,153 @@
+"""
+Sqlite catalog of every transcript written by send_batch, so listing transcripts is an indexed query
+instead of a scan of the working directory. a new catalog starts out with the transcripts already in the
+working directory, and transcripts written to it while the app wasn't recording them can be added by
+running this file from there:
+
+    python transcript_catalog.py
+
+@author Preston Mackert
+"""
+
+# ---------------------------------------------------------------------------------------------------- #
+# imports
+# ---------------------------------------------------------------------------------------------------- #
+
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+import config
+
+
+# ---------------------------------------------------------------------------------------------------- #
+# schema
+# ---------------------------------------------------------------------------------------------------- #
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transcripts (
+    path TEXT PRIMARY KEY,
+    duration REAL,
+    word_count INTEGER NOT NULL,
+    confidence REAL NOT NULL,
+    ingested_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS transcripts_confidence ON transcripts (confidence);
+CREATE INDEX IF NOT EXISTS transcripts_ingested_at ON transcripts (ingested_at);
+"""
+
+# the columns a listing can be sorted by, keyed by the name used in urls
+SORT_COLUMNS = {"date": "ingested_at", "confidence": "confidence", "duration": "duration", "words": "word_count"}
+
+
+# ---------------------------------------------------------------------------------------------------- #
+# support methods
+# ---------------------------------------------------------------------------------------------------- #
+
+@contextmanager
+def connect(db_path=None):
+    """ opens the catalog for the length of a with block, creating the tables the first time. connections
+    are cheap, so every caller opens its own rather than sharing one across threads """
+    db_path = db_path or config.catalog_path
+    connection = sqlite3.connect(db_path)
+    connection.row_factory = sqlite3.Row
+    try:
+        created = connection.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = "
+                                     "'transcripts'").fetchone() is None
+        connection.executescript(SCHEMA)
+        if created:
+            # a new catalog starts out with the transcripts already in the working directory, so a fresh
+            # checkout lists and serves them without running this file by hand first
+            import helper_functions as helper
+            helper.register_existing_transcripts(os.getcwd(), db_path)
+        with connection:
+            yield connection
+    finally:
+        connection.close()
+
+
+def record_transcript(path, word_count, confidence, duration=None, ingested_at=None, db_path=None):
+    """ adds a transcript to the catalog, or refreshes its row if it was transcribed again """
+    ingested_at = time.time() if ingested_at is None else ingested_at
+    with connect(db_path) as connection:
+        connection.execute("INSERT OR REPLACE INTO transcripts (path, duration, word_count, confidence, "
+                           "ingested_at) VALUES (?, ?, ?, ?, ?)",
+                           (path, duration, word_count, confidence, ingested_at))
+
+
+def remove_transcript(path, db_path=None):
+    with connect(db_path) as connection:
+        connection.execute("DELETE FROM transcripts WHERE path = ?", (path,))
+
+
+def has_transcript(path, db_path=None):
+    with connect(db_path) as connection:
+        return connection.execute("SELECT 1 FROM transcripts WHERE path = ?", (path,)).fetchone() is not None
+
+
+def list_transcripts(sort="date", descending=True, limit=50, offset=0, db_path=None):
+    """ one page of catalog rows ordered by the given sort key, see SORT_COLUMNS """
+    column = SORT_COLUMNS.get(sort, SORT_COLUMNS["date"])
+    direction = "DESC" if descending else "ASC"
+    with connect(db_path) as connection:
+        return connection.execute("SELECT * FROM transcripts ORDER BY " + column + " " + direction +
+                                  ", path LIMIT ? OFFSET ?", (limit, offset)).fetchall()
+
+
+def iter_transcripts(since=None, until=None, min_confidence=None, batch=500, db_path=None):
+    """ every catalog row ingested in [since, until) with at least min_confidence, oldest first. rows are
+    fetched batch at a time so the whole catalog is never held in memory, and each batch is read in its
+    own short connection, picking up after the last row of the one before, so a caller working through
+    the rows never holds a read lock that would keep new transcripts from being recorded """
+    clauses = []
+    params = []
+    if since is not None:
+        clauses.append("ingested_at >= ?")
+        params.append(since)
+    if until is not None:
+        clauses.append("ingested_at < ?")
+        params.append(until)
+    if min_confidence is not None:
+        clauses.append("confidence >= ?")
+        params.append(min_confidence)
+
+    last = None
+    while True:
+        page_clauses = list(clauses)
+        page_params = list(params)
+        if last is not None:
+            page_clauses.append("(ingested_at > ? OR (ingested_at = ? AND path > ?))")
+            page_params.extend([last["ingested_at"], last["ingested_at"], last["path"]])
+        where = " WHERE " + " AND ".join(page_clauses) if page_clauses else ""
+        with connect(db_path) as connection:
+            rows = connection.execute("SELECT * FROM transcripts" + where + " ORDER BY ingested_at, path "
+                                      "LIMIT ?", page_params + [batch]).fetchall()
+        if not rows:
+            return
+        for row in rows:
+            yield row
+        last = rows[-1]
+
+
+def count_transcripts(db_path=None):
+    with connect(db_path) as connection:
+        return connection.execute("SELECT COUNT(*) FROM transcripts").fetchone()[0]
+
+
+# ---------------------------------------------------------------------------------------------------- #
+# main method
+# ---------------------------------------------------------------------------------------------------- #
+
+def main():
+    # imported here since helper_functions itself imports the catalog
+    import helper_functions as helper
+    added = helper.register_existing_transcripts(os.getcwd())
+    print("catalogued " + str(added) + " transcripts")
+
+
+# ---------------------------------------------------------------------------------------------------- #
+# call main
+# ---------------------------------------------------------------------------------------------------- #
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Reading and writing transcripts on disk. Watson's response used to be stored as a json string holding
+indented json, this compact format stores it once with the words and their confidences kept in
+parallel arrays instead of one small list per word
+
+@author Preston Mackert
+"""
+
+# ---------------------------------------------------------------------------------------------------- #
+# imports
+# ---------------------------------------------------------------------------------------------------- #
+
+import json
+import os
+import tempfile
+import metrics
+
+
+# ---------------------------------------------------------------------------------------------------- #
+# format description
+# ---------------------------------------------------------------------------------------------------- #
+
+# a compact transcript is a single json object shaped like this, the nth chunk owns word_counts[n] words
+# {"format": "compact-transcript", "version": 1,
+#  "transcripts": [...], "confidences": [...], "word_counts": [...],
+#  "words": [...], "word_confidences": [...]}
+COMPACT_FORMAT = "compact-transcript"
+COMPACT_VERSION = 1
+
+
+# ---------------------------------------------------------------------------------------------------- #
+# writing
+# ---------------------------------------------------------------------------------------------------- #
+
+def compact_from_results(results):
+    """ flattens watson's list of results into the parallel arrays of the compact format """
+    compact = {"format": COMPACT_FORMAT, "version": COMPACT_VERSION, "transcripts": [], "confidences": [],
+               "word_counts": [], "words": [], "word_confidences": []}
+
+    for result in results:
+        alternatives = result.get("alternatives")[0]
+        word_confidence = alternatives.get("word_confidence") or []
+        compact["transcripts"].append(alternatives.get("transcript"))
+        compact["confidences"].append(alternatives.get("confidence"))
+        compact["word_counts"].append(len(word_confidence))
+        for word, confidence in word_confidence:
+            compact["words"].append(word)
+            compact["word_confidences"].append(confidence)
+
+    return compact
+
+
+def write_compact(path, results):
+    """ writes a list of watson results to path in the compact format, replacing the file atomically """
+    # a temp file of its own, so two writers of the same transcript can't replace each other's
+    handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)),
+                                         prefix=os.path.basename(path), suffix=".tmp")
+    try:
+        with os.fdopen(handle, "w") as outfile:
+            json.dump(compact_from_results(results), outfile, separators=(",", ":"))
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+# ---------------------------------------------------------------------------------------------------- #
+# reading
+# ---------------------------------------------------------------------------------------------------- #
+
+def is_compact(data):
+    return isinstance(data, dict) and data.get("format") == COMPACT_FORMAT
+
+
+def read_transcript_file(path):
+    """ reads a .json transcript in either format. compact files come back as the compact dict, the old
+    double encoded files come back as the list of watson results """
+    with metrics.span("transcript_read"):
+        with open(path) as infile:
+            raw = infile.read()
+
+    with metrics.span("json_decode"):
+        data = json.loads(raw)
+        # the old format is a json string that holds another json document
+        if isinstance(data, str):
+            data = json.loads(data)
+    if is_compact(data):
+        return data
+    return data.get("results")
+
@@ -0,0 +1,191 @@
+"""
+Background transcription jobs. /sendfiles only records a job and hands back its id, a worker thread
+works through the job's files with send_batch, and the state of every file lives in sqlite so a job
+picks up where it left off after a restart
+
+@author Preston Mackert
+"""
+
+# ---------------------------------------------------------------------------------------------------- #
+# imports
+# ---------------------------------------------------------------------------------------------------- #
+
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+import config
+import helper_functions as helper
+
+
+# ---------------------------------------------------------------------------------------------------- #
+# schema
+# ---------------------------------------------------------------------------------------------------- #
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    folder TEXT NOT NULL,
+    status TEXT NOT NULL,
+    created REAL NOT NULL,
+    heartbeat REAL
+);
+CREATE TABLE IF NOT EXISTS job_files (
+    job_id TEXT NOT NULL,
+    file TEXT NOT NULL,
+    status TEXT NOT NULL,
+    error TEXT,
+    PRIMARY KEY (job_id, file)
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created);
+"""
+
+# a file is queued, running (in flight), done or failed. a job is queued, running, finished, or failed
+# when its batch stopped with an error, which is then recorded against each of its unfinished files
+
+
+@contextmanager
+def connect(db_path=None):
+    connection = sqlite3.connect(db_path or config.jobs_path, timeout=30)
+    connection.row_factory = sqlite3.Row
+    try:
+        connection.executescript(SCHEMA)
+        with connection:
+            yield connection
+    finally:
+        connection.close()
+
+
+# ---------------------------------------------------------------------------------------------------- #
+# queue
+# ---------------------------------------------------------------------------------------------------- #
+
+def enqueue(folder):
+    """ records a job for every file currently in folder and returns its id """
+    job_id = uuid.uuid4().hex
+    try:
+        files = sorted(os.listdir(folder))
+    except OSError:
+        print("invalid folder")
+        files = []
+    with connect() as connection:
+        connection.execute("INSERT INTO jobs (id, folder, status, created) VALUES (?, ?, 'queued', ?)",
+                           (job_id, folder, time.time()))
+        connection.executemany("INSERT INTO job_files (job_id, file, status) VALUES (?, ?, 'queued')",
+                               [(job_id, file) for file in files])
+    return job_id
+
+
+def job_status(job_id):
+    """ progress of a job: how many of its files are done, in flight, failed and still queued, or None
+    for an unknown job """
+    with connect() as connection:
+        job = connection.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if job is None:
+            return None
+        counts = dict(connection.execute("SELECT status, COUNT(*) FROM job_files WHERE job_id = ? "
+                                         "GROUP BY status", (job_id,)).fetchall())
+        failures = dict(connection.execute("SELECT file, error FROM job_files WHERE job_id = ? AND "
+                                           "status = 'failed'", (job_id,)).fetchall())
+
+    return {"id": job_id, "folder": job["folder"], "status": job["status"], "total": sum(counts.values()),
+            "done": counts.get("done", 0), "in_flight": counts.get("running", 0),
+            "failed": counts.get("failed", 0), "queued": counts.get("queued", 0), "errors": failures}
+
+
+def claim_job():
+    """ takes the oldest job nobody is working on. a running job whose worker stopped sending heartbeats
+    (the process died or was restarted) counts as free again, and its in flight files go back in line """
+    stale = time.time() - config.job_lease_seconds
+    with connect() as connection:
+        job = connection.execute("SELECT * FROM jobs WHERE status = 'queued' OR (status = 'running' AND "
+                                 "heartbeat < ?) ORDER BY created LIMIT 1", (stale,)).fetchone()
+        if job is None:
+            return None
+        claimed = connection.execute("UPDATE jobs SET status = 'running', heartbeat = ? WHERE id = ? AND "
+                                     "heartbeat IS ?", (time.time(), job["id"], job["heartbeat"])).rowcount
+        if not claimed:
+            return None
+        connection.execute("UPDATE job_files SET status = 'queued' WHERE job_id = ? AND status = 'running'",
+                           (job["id"],))
+        return job["id"], job["folder"]
+
+
+def set_file_status(job_id, file, status, error=None):
+    with connect() as connection:
+        connection.execute("UPDATE job_files SET status = ?, error = ? WHERE job_id = ? AND file = ?",
+                           (status, error, job_id, file))
+
+
+def keep_alive(job_id, stop):
+    """ renews the job's lease until stop is set, so a slow file doesn't make the job look abandoned """
+    while not stop.wait(config.job_lease_seconds / 3.0):
+        with connect() as connection:
+            connection.execute("UPDATE jobs SET heartbeat = ? WHERE id = ?", (time.time(), job_id))
+
+
+def run_job(job_id, folder):
+    """ transcribes the files of a job that are not finished yet, recording each one as it goes """
+    with connect() as connection:
+        files = [row["file"] for row in connection.execute("SELECT file FROM job_files WHERE job_id = ? AND "
+                                                           "status = 'queued'", (job_id,))]
+
+    stop = threading.Event()
+    threading.Thread(target=keep_alive, args=(job_id, stop), daemon=True).start()
+    try:
+        helper.send_batch(folder, files=files,
+                          on_start=lambda file: set_file_status(job_id, file, "running"),
+                          on_result=lambda file, error: set_file_status(job_id, file,
+                                                                        "failed" if error else "done", error))
+    except Exception as error:
+        # failing the job for good, otherwise it is claimed again once its lease runs out and fails again
+        fail_job(job_id, str(error))
+        raise
+    finally:
+        stop.set()
+
+    with connect() as connection:
+        connection.execute("UPDATE jobs SET status = 'finished', heartbeat = ? WHERE id = ?",
+                           (time.time(), job_id))
+
+
+def fail_job(job_id, error):
+    """ marks a job and every file it hadn't finished as failed with the error that stopped it """
+    with connect() as connection:
+        connection.execute("UPDATE jobs SET status = 'failed', heartbeat = ? WHERE id = ?",
+                           (time.time(), job_id))
+        connection.execute("UPDATE job_files SET status = 'failed', error = ? WHERE job_id = ? AND status IN "
+                           "('queued', 'running')", (error, job_id))
+
+
+# ---------------------------------------------------------------------------------------------------- #
+# worker
+# ---------------------------------------------------------------------------------------------------- #
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def work_forever():
+    """ runs jobs one after another, polling for new ones when the queue is empty """
+    while True:
+        claimed = claim_job()
+        if claimed is None:
+            time.sleep(config.job_poll_seconds)
+            continue
+        try:
+            run_job(*claimed)
+        except Exception as error:
+            print("transcription job " + claimed[0] + " stopped: " + str(error))
+
+
+def start_worker():
+    """ starts this process's worker thread if it isn't running yet, it also resumes any job left
+    unfinished by a previous run """
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=work_forever, name="transcription-jobs", daemon=True)
+            _worker.start()
@@ -0,0 +1,147 @@
+"""
+Shared plumbing for the calls made to IBM Watson: the sdk itself, loaded on first use, a pool of long
+lived clients, a token bucket that keeps the app under the service's rate limit, and a persistent cache
+of formatted results keyed by a hash of the text that was analyzed
+
+@author Preston Mackert
+"""
+
+# ---------------------------------------------------------------------------------------------------- #
+# imports
+# ---------------------------------------------------------------------------------------------------- #
+
+import hashlib
+import json
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+
+# ---------------------------------------------------------------------------------------------------- #
+# sdk
+# ---------------------------------------------------------------------------------------------------- #
+
+def watson_sdk():
+    """ the watson sdk, imported the first time a client is built. it pulls in most of a second of
+    dependencies that pages which never call watson shouldn't have to load """
+    import watson_developer_cloud
+    return watson_developer_cloud
+
+
+# ---------------------------------------------------------------------------------------------------- #
+# rate limiting
+# ---------------------------------------------------------------------------------------------------- #
+
+class TokenBucket(object):
+    """ allows rate calls per second on average with bursts of up to capacity calls, acquire blocks until
+    a token is free """
+
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+# ---------------------------------------------------------------------------------------------------- #
+# client pool
+# ---------------------------------------------------------------------------------------------------- #
+
+class ClientPool(object):
+    """ hands out up to size clients built by factory, creating them only as they are needed and reusing
+    them across requests instead of building a new one for every call """
+
+    def __init__(self, factory, size):
+        self.factory = factory
+        self.size = size
+        self.created = 0
+        self.idle = queue.LifoQueue()
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def client(self):
+        client = self.checkout()
+        try:
+            yield client
+        finally:
+            self.idle.put(client)
+
+    def checkout(self):
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self.lock:
+            if self.created < self.size:
+                self.created += 1
+                build = True
+            else:
+                build = False
+        if build:
+            try:
+                return self.factory()
+            except Exception:
+                with self.lock:
+                    self.created -= 1
+                raise
+        return self.idle.get()
+
+
+# ---------------------------------------------------------------------------------------------------- #
+# result cache
+# ---------------------------------------------------------------------------------------------------- #
+
+class ResultCache(object):
+    """ sqlite backed store of formatted analysis results. a result is keyed by the service name and a
+    sha256 of the text, so the same transcript is only ever sent to a service once """
+
+    SCHEMA = "CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, service TEXT, result TEXT, created REAL)"
+
+    def __init__(self, path):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+
+    @contextmanager
+    def connect(self):
+        connection = sqlite3.connect(self.path)
+        try:
+            connection.execute(self.SCHEMA)
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    @staticmethod
+    def key(service, text):
+        return service + ":" + hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """ a freshly decoded copy of the stored result, or None """
+        with self.connect() as connection:
+            row = connection.execute("SELECT result FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key, result):
+        with self.connect() as connection:
+            connection.execute("INSERT OR REPLACE INTO results (key, service, result, created) VALUES (?, ?, ?, ?)",
+                               (key, key.split(":", 1)[0], json.dumps(result), time.time()))
@@ -0,0 +1,163 @@
+"""
+Compact in memory form of a transcript's word confidence levels. the words live in a single string with
+an offset array marking where each one starts, and the confidences in a float array, instead of one
+small [word, confidence] list per word. the statistics for the analytics pages are computed over the
+whole array at once, with numpy when it is installed. numpy is only imported the first time a statistic
+is asked for, so importing this module stays cheap
+
+@author Preston Mackert
+"""
+
+# ---------------------------------------------------------------------------------------------------- #
+# imports
+# ---------------------------------------------------------------------------------------------------- #
+
+import math
+import sys
+from array import array
+from bisect import bisect_right
+
+# numpy once it has been looked for, False until then and None if it isn't installed
+_numpy = False
+
+
+def load_numpy():
+    global _numpy
+    if _numpy is False:
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+        _numpy = numpy
+    return _numpy
+
+
+# ---------------------------------------------------------------------------------------------------- #
+# word confidences
+# ---------------------------------------------------------------------------------------------------- #
+
+class WordConfidences(object):
+    """ sequence of (word, confidence) pairs. indexing and iterating give [word, confidence] lists so
+    templates written against the old list of lists keep working """
+
+    __slots__ = ("buffer", "offsets", "confidences")
+
+    def __init__(self, words=(), confidences=()):
+        words = list(words)
+        self.buffer = "".join(words)
+        self.offsets = array("I", [0])
+        end = 0
+        for word in words:
+            end += len(word)
+            self.offsets.append(end)
+        # doubles keep watson's values exactly, still a fraction of the size of boxed floats
+        self.confidences = array("d", confidences)
+        if len(self.confidences) != len(words):
+            raise ValueError("got " + str(len(words)) + " words but " + str(len(self.confidences)) +
+                             " confidences")
+
+    @classmethod
+    def from_pairs(cls, pairs):
+        """ builds the compact form from watson's list of [word, confidence] pairs """
+        pairs = list(pairs)
+        return cls([pair[0] for pair in pairs], [pair[1] for pair in pairs])
+
+    def __len__(self):
+        return len(self.confidences)
+
+    def word(self, index):
+        return self.buffer[self.offsets[index]:self.offsets[index + 1]]
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("word index out of range")
+        return [self.word(index), self.confidences[index]]
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield [self.word(index), self.confidences[index]]
+
+    def words(self, start=0, end=None):
+        end = len(self) if end is None else end
+        return [self.word(index) for index in range(start, end)]
+
+    def nbytes(self):
+        """ memory held by the buffers, for the transcript cache's accounting """
+        return (sys.getsizeof(self.buffer) + self.offsets.itemsize * len(self.offsets) +
+                self.confidences.itemsize * len(self.confidences))
+
+    # ------------------------------------------------------------------------------------------------ #
+    # statistics
+    # ------------------------------------------------------------------------------------------------ #
+
+    def as_numpy(self):
+        """ a zero copy numpy view of the confidences """
+        numpy = load_numpy()
+        return numpy.frombuffer(self.confidences, dtype=numpy.float64)
+
+    def mean(self):
+        if not len(self):
+            return None
+        if load_numpy() is not None:
+            return float(self.as_numpy().mean())
+        return math.fsum(self.confidences) / len(self)
+
+    def percentile(self, percent):
+        """ linear interpolation between the closest ranks, the same as numpy's default """
+        if not len(self):
+            return None
+        numpy = load_numpy()
+        if numpy is not None:
+            return float(numpy.percentile(self.as_numpy(), percent))
+        ordered = sorted(self.confidences)
+        rank = (len(ordered) - 1) * percent / 100.0
+        low = int(math.floor(rank))
+        high = min(low + 1, len(ordered) - 1)
+        return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+    def histogram(self, bins=10):
+        """ counts of words per equal width confidence bucket between 0 and 1, a confidence of exactly 1
+        lands in the last bucket """
+        numpy = load_numpy()
+        if numpy is not None:
+            counts, _ = numpy.histogram(self.as_numpy(), bins=bins, range=(0.0, 1.0))
+            return [int(count) for count in counts]
+        # the same bucket edges numpy.linspace would give, so both paths agree on values at an edge
+        step = 1.0 / bins
+        edges = [index * step for index in range(bins)] + [1.0]
+        counts = [0] * bins
+        for confidence in self.confidences:
+            counts[min(max(bisect_right(edges, confidence) - 1, 0), bins - 1)] += 1
+        return counts
+
+    def low_confidence_spans(self, threshold=0.5, min_length=1):
+        """ (start, end) word index ranges where every word is below threshold, end exclusive, so the
+        stretches of a call the recognizer struggled with can be pulled out """
+        numpy = load_numpy()
+        if numpy is not None:
+            # pad with False on both sides so every run of low words has a rising and a falling edge
+            below = numpy.concatenate(([False], self.as_numpy() < threshold, [False]))
+            edges = numpy.flatnonzero(below[1:] != below[:-1])
+            return [(int(start), int(end)) for start, end in zip(edges[::2], edges[1::2])
+                    if end - start >= min_length]
+
+        spans = []
+        start = None
+        for index, confidence in enumerate(self.confidences):
+            if confidence < threshold:
+                if start is None:
+                    start = index
+            elif start is not None:
+                if index - start >= min_length:
+                    spans.append((start, index))
+                start = None
+        if start is not None and len(self) - start >= min_length:
+            spans.append((start, len(self)))
+        return spans
+
+    def percentages(self, digits=2):
+        """ [word, confidence as a percent] pairs, rounded for display """
+        return [[self.word(index), round(confidence * 100, digits)]
+                for index, confidence in enumerate(self.confidences)]